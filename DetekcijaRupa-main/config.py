@@ -29,6 +29,7 @@ class Config:
     SAVE_VIDEO = True  # Set to True only when you want to save a video
     VIDEO_OUTPUT_PATH = "output/demo_output.avi"  # Or .mp4 if supported
     VIDEO_FPS = 20  # Adjust FPS based on input video
+    ANNOTATE_FRAMES = True  # Set to False to skip drawing (database/logs only, raw frames shown and saved)
 
     # Database Configuration
     DB_HOST: str = 'localhost'
@@ -229,14 +229,16 @@ class PotholeDetector:
         else:
             return Severity.CRITICAL
 
-    def detect_potholes(self, image: np.ndarray, gps_data: Dict = None) -> Tuple[List[Pothole], np.ndarray]:
+    def detect_potholes(self, image: np.ndarray, gps_data: Dict = None,
+                        annotate: bool = True) -> Tuple[List[Pothole], np.ndarray]:
         """
         Detect potholes in the image and return list of Pothole objects and annotated image
+        With annotate=False the input image is returned as is (no copy, nothing drawn)
         """
         h, w = image.shape[:2]
         results = self.yolo_model.predict(image, conf=0.5)
         potholes = []
-        annotated_image = image.copy()
+        annotated_image = image.copy() if annotate else image
 
         for result in results:
             if result.masks is not None:
@@ -283,6 +285,9 @@ class PotholeDetector:
                         )
                         potholes.append(pothole)
 
+                        if not annotate:
+                            continue
+
                         # Annotate image
                         # Draw contour
                         cv2.drawContours(annotated_image, [largest_contour], -1, (0, 0, 255), 2)
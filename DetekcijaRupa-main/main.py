@@ -104,7 +104,7 @@ class PotholeDetectionSystem:
                     cv2.putText(frame, gps_text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
 
                 # Detect potholes
-                potholes, annotated_frame = self.detector.detect_potholes(frame, gps_data)
+                potholes, annotated_frame = self.detector.detect_potholes(frame, gps_data, annotate=config.ANNOTATE_FRAMES)
 
                 # Process detected potholes
                 for pothole in potholes:
@@ -0,0 +1,121 @@
+"""Check ONNX Runtime detections against torch and compare their frames/sec.
+
+Usage:
+    python benchmark_backends.py --video p.mp4
+    python benchmark_backends.py --video p.mp4 --frames 200 --batch-size 8 --intra-threads 4
+
+Both backends run on the same decoded frames. Parity pairs every torch box
+with the ONNX box of highest IoU and reports unmatched boxes, the lowest IoU
+and the largest confidence difference; throughput is measured after a
+warm-up batch.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from simple_config_v2 import MODEL_PATH, INPUT_VIDEO, BATCH_SIZE, ONNX_INTER_OP_THREADS
+from inference_backend import UltralyticsBackend, OnnxBackend
+
+
+def read_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video: {video_path}")
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def batches(frames, batch_size):
+    for start in range(0, len(frames), batch_size):
+        yield frames[start:start + batch_size]
+
+
+def box_iou(a, b):
+    """IoU matrix between two ``(N, 4)`` xyxy arrays"""
+    a = a.astype(np.float64)[:, None]
+    b = b.astype(np.float64)[None]
+    width = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(0)
+    height = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(0)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / (area_a + area_b - intersection + 1e-9)
+
+
+def parity(reference, candidate, iou_threshold=0.9):
+    """Compare per-frame boxes of two backends"""
+    report = {'boxes': 0, 'unmatched': 0, 'extra': 0, 'min_iou': 1.0, 'max_conf_diff': 0.0}
+    for (ref_xyxy, ref_conf), (cand_xyxy, cand_conf) in zip(reference, candidate):
+        report['boxes'] += len(ref_xyxy)
+        if len(ref_xyxy) == 0 or len(cand_xyxy) == 0:
+            report['unmatched'] += len(ref_xyxy)
+            report['extra'] += len(cand_xyxy)
+            continue
+        ious = box_iou(ref_xyxy, cand_xyxy)
+        best = ious.argmax(axis=1)
+        best_iou = ious[np.arange(len(ref_xyxy)), best]
+        matched = best_iou >= iou_threshold
+        report['unmatched'] += int((~matched).sum())
+        report['extra'] += max(0, len(cand_xyxy) - int(matched.sum()))
+        if matched.any():
+            report['min_iou'] = min(report['min_iou'], float(best_iou[matched].min()))
+            report['max_conf_diff'] = max(report['max_conf_diff'],
+                                          float(np.abs(ref_conf[matched] - cand_conf[best[matched]]).max()))
+    return report
+
+
+def benchmark(backend, frames, batch_size):
+    """Boxes of every frame and the frames/sec of the backend"""
+    backend.predict(frames[:batch_size])  # warm-up
+    outputs = []
+    start = time.perf_counter()
+    for batch in batches(frames, batch_size):
+        outputs.extend(backend.predict(batch))
+    elapsed = time.perf_counter() - start
+    return outputs, len(frames) / elapsed if elapsed > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--video', default=INPUT_VIDEO)
+    parser.add_argument('--frames', type=int, default=100, help='number of frames to run')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--intra-threads', type=int, default=0, help='ONNX intra-op threads (0 = default)')
+    parser.add_argument('--inter-threads', type=int, default=ONNX_INTER_OP_THREADS)
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    if not frames:
+        raise SystemExit("No frames decoded")
+    print(f"{len(frames)} frames of {args.video}, batch size {args.batch_size}")
+
+    torch_boxes, torch_fps = benchmark(UltralyticsBackend(args.model), frames, args.batch_size)
+    onnx_backend = OnnxBackend(args.model, intra_op_threads=args.intra_threads, inter_op_threads=args.inter_threads)
+    onnx_boxes, onnx_fps = benchmark(onnx_backend, frames, args.batch_size)
+
+    report = parity(torch_boxes, onnx_boxes)
+    print(f"\nParity (torch reference, {report['boxes']} boxes):")
+    print(f"  unmatched torch boxes:  {report['unmatched']}")
+    print(f"  extra onnx boxes:       {report['extra']}")
+    print(f"  lowest matched IoU:     {report['min_iou']:.3f}")
+    print(f"  max confidence diff:    {report['max_conf_diff']:.4f}")
+
+    print(f"\n{'Backend':<12} {'FPS':>8}")
+    print("-" * 21)
+    print(f"{'ultralytics':<12} {torch_fps:>8.2f}")
+    print(f"{'onnx':<12} {onnx_fps:>8.2f}")
+    if torch_fps > 0:
+        print(f"\nONNX Runtime speedup: {onnx_fps / torch_fps:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Frames/sec and recall of the model at several inference sizes.
+
+Usage:
+    python benchmark_inference_size.py --video p.mp4
+    python benchmark_inference_size.py --video p.mp4 --sizes 320 480 640 --backend onnx --frames 200
+
+Every size runs on the same decoded frames, downscaled up front like
+INFERENCE_SIZE does. Without labelled data the reference is the model at
+--reference-size (default: the frames' native resolution): recall is the
+share of reference boxes still found at a size (IoU >= --iou), precision
+the share of boxes at that size the reference agrees with.
+"""
+import argparse
+
+from simple_config_v2 import MODEL_PATH, INPUT_VIDEO, BATCH_SIZE, INFERENCE_BACKEND
+from inference_backend import STRIDE, create_backend
+from benchmark_backends import read_frames, benchmark
+from quantization_report import agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--video', default=INPUT_VIDEO)
+    parser.add_argument('--backend', default=INFERENCE_BACKEND, choices=['ultralytics', 'onnx'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[320, 480, 640])
+    parser.add_argument('--reference-size', type=int, default=0, help='reference inference size (0 = native)')
+    parser.add_argument('--frames', type=int, default=100, help='number of frames to run')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU for a box to count as found')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    if not frames:
+        raise SystemExit("No frames decoded")
+    height, width = frames[0].shape[:2]
+    reference_size = args.reference_size or -(-max(height, width) // STRIDE) * STRIDE
+    print(f"{len(frames)} frames of {args.video} ({width}x{height}), {args.backend} backend, "
+          f"batch size {args.batch_size}, reference size {reference_size}\n")
+
+    reference, reference_fps = benchmark(create_backend(args.backend, args.model, inference_size=reference_size),
+                                         frames, args.batch_size)
+    reference_boxes = sum(len(xyxy) for xyxy, _ in reference)
+
+    rows = []
+    for size in sorted(set(args.sizes)):
+        backend = create_backend(args.backend, args.model, inference_size=size)
+        outputs, fps = benchmark(backend, frames, args.batch_size)
+        rows.append((size, fps, sum(len(xyxy) for xyxy, _ in outputs), agreement(reference, outputs, args.iou)))
+
+    print(f"{'Size':>6} {'FPS':>8} {'Speedup':>8} {'Boxes':>7} {'Recall':>7} {'Precision':>9} {'Mean IoU':>9}")
+    print("-" * 60)
+    print(f"{reference_size:>6} {reference_fps:>8.2f} {1:>7.2f}x {reference_boxes:>7} {'ref':>7} {'ref':>9} {'ref':>9}")
+    for size, fps, boxes, acc in rows:
+        speedup = fps / reference_fps if reference_fps else 0.0
+        print(f"{size:>6} {fps:>8.2f} {speedup:>7.2f}x {boxes:>7} {acc['recall']:>7.3f} "
+              f"{acc['precision']:>9.3f} {acc['mean_iou']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import numpy as np
+
+from simple_config_v2 import (
+    MIN_DEPTH, MAX_DEPTH, DEPTH_SCALE_FACTOR, ENABLE_FILTERING, MIN_DETECTION_CONFIDENCE,
+    MIN_BBOX_SIZE, MAX_BBOX_SIZE, ASPECT_RATIO_RANGE
+)
+
+
+class DepthCategoryTable:
+    """Precomputed depth -> category lookup.
+
+    Categories are ordered once (by priority, or by definition order for
+    configs without priorities) and assigned to whole arrays of depths with
+    ``np.searchsorted``: a depth falls in the first category whose
+    ``max_depth`` it does not exceed.
+    """
+
+    def __init__(self, depth_categories, by_priority=True):
+        items = list(depth_categories.items())
+        if by_priority:
+            items.sort(key=lambda x: x[1]['priority'])
+        self.names = [category for category, _ in items]
+        self.colors = [config['color'] for _, config in items]
+        self.thresholds = np.array([config['max_depth'] for _, config in items], dtype=np.float64)
+        if np.any(np.diff(self.thresholds) < 0):
+            raise ValueError("Depth category thresholds must increase with category order")
+        self.fallback = self.names.index('critical') if 'critical' in self.names else len(self.names) - 1
+
+    def lookup(self, depths):
+        """Category indices for an array of depths"""
+        indices = np.searchsorted(self.thresholds, depths, side='left')
+        indices[indices >= len(self.names)] = self.fallback
+        return indices
+
+    def category(self, depth):
+        """Single depth -> ``(category, color)``"""
+        index = int(self.lookup(np.array([depth]))[0])
+        return self.names[index], self.colors[index]
+
+
+class DetectionStats:
+    """Per-run detection counts, so concurrent runs never share statistics"""
+
+    def __init__(self, depth_categories):
+        self.depth_categories = depth_categories
+        self.counts = {category: 0 for category in depth_categories}
+        self.total = 0
+
+    def add(self, detections):
+        for detection in detections:
+            self.counts[detection['category']] += 1
+        self.total += len(detections)
+
+    def to_dict(self):
+        """Totals plus per-category count, percentage, description and priority"""
+        stats = {
+            'total_detections': self.total,
+            'categories': {}
+        }
+        for category, config in sorted(self.depth_categories.items(), key=lambda x: x[1]['priority']):
+            count = self.counts[category]
+            stats['categories'][category] = {
+                'count': count,
+                'percentage': (count / self.total * 100) if self.total > 0 else 0,
+                'description': config['description'],
+                'priority': config['priority']
+            }
+        return stats
+
+
+def extract_boxes(result):
+    """All boxes of a model result as ``(xyxy int array, confidence array)``.
+
+    Boxes and confidences are moved off the device in one transfer each
+    instead of once per box.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.empty((0, 4), dtype=np.int64), np.empty(0, dtype=np.float64)
+    xyxy = boxes.xyxy.cpu().numpy().astype(np.int64)
+    confidences = boxes.conf.cpu().numpy().astype(np.float64)
+    return xyxy, confidences
+
+
+def box_sizes(xyxy):
+    """Widths and heights of an ``(N, 4)`` xyxy array"""
+    return xyxy[:, 2] - xyxy[:, 0], xyxy[:, 3] - xyxy[:, 1]
+
+
+def aspect_ratios(widths, heights):
+    """Width / height, 1.0 where the height is zero"""
+    widths = np.asarray(widths, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    return np.divide(widths, heights, out=np.ones_like(widths), where=heights > 0)
+
+
+def estimate_depth_enhanced(widths, heights, frame_width, frame_height, confidences):
+    """Vectorized enhanced depth estimate (meters) for arrays of boxes"""
+    widths = np.asarray(widths, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    confidences = np.asarray(confidences, dtype=np.float64)
+    normalized_area = (widths * heights) / (frame_width * frame_height)
+
+    # Method 1: Area-based depth estimation
+    depth_area = np.maximum(MIN_DEPTH, MAX_DEPTH - (normalized_area * DEPTH_SCALE_FACTOR * 0.3))
+
+    # Method 2: Aspect ratio based depth estimation
+    depth_aspect = np.maximum(MIN_DEPTH, 0.25 - (aspect_ratios(widths, heights) * 0.05))
+
+    # Method 3: Size-based depth estimation
+    avg_size = (widths + heights) / 2
+    depth_size = np.maximum(MIN_DEPTH, 0.28 - (avg_size / frame_width * 0.2))
+
+    # Method 4: Confidence-based depth adjustment
+    confidence_adjustment = 1.0 - (confidences * 0.3)
+
+    # Weighted combination
+    depth_combined = (
+        depth_area * 0.4 +
+        depth_aspect * 0.2 +
+        depth_size * 0.4
+    ) * confidence_adjustment
+
+    # Apply depth constraints
+    return np.clip(depth_combined, MIN_DEPTH, MAX_DEPTH)
+
+
+def filter_mask(widths, heights, confidences):
+    """Boolean mask of the boxes passing the quality filters"""
+    widths = np.asarray(widths)
+    heights = np.asarray(heights)
+    confidences = np.asarray(confidences)
+    if not ENABLE_FILTERING:
+        return np.ones(len(confidences), dtype=bool)
+    ratios = aspect_ratios(widths, heights)
+    return (
+        (confidences >= MIN_DETECTION_CONFIDENCE) &
+        (widths >= MIN_BBOX_SIZE) & (heights >= MIN_BBOX_SIZE) &
+        (widths <= MAX_BBOX_SIZE) & (heights <= MAX_BBOX_SIZE) &
+        (ratios >= ASPECT_RATIO_RANGE[0]) & (ratios <= ASPECT_RATIO_RANGE[1])
+    )
+
+
+def build_detections(xyxy, confidences, depths, category_indices, table):
+    """Detection dicts (the format used by the detectors) from the arrays"""
+    detections = []
+    for (x1, y1, x2, y2), confidence, depth, index in zip(xyxy.tolist(), confidences.tolist(),
+                                                         depths.tolist(), category_indices.tolist()):
+        detections.append({
+            'bbox': (x1, y1, x2, y2),
+            'width': x2 - x1,
+            'height': y2 - y1,
+            'depth': depth,
+            'category': table.names[index],
+            'color': table.colors[index],
+            'confidence': confidence,
+            'center': ((x1 + x2) // 2, (y1 + y2) // 2)
+        })
+    return detections
+
+
+def postprocess_boxes(xyxy, confidences, frame_shape, table, depth_jitter=0.0):
+    """Filter boxes, estimate depth and assign categories for a whole frame.
+
+    ``depth_jitter`` randomly scales each depth by up to +/- that fraction
+    (as the enhanced detector does) before clamping to the depth range.
+    """
+    frame_height, frame_width = frame_shape[:2]
+    widths, heights = box_sizes(xyxy)
+    keep = filter_mask(widths, heights, confidences)
+    xyxy, confidences = xyxy[keep], confidences[keep]
+    widths, heights = widths[keep], heights[keep]
+
+    depths = estimate_depth_enhanced(widths, heights, frame_width, frame_height, confidences)
+    if depth_jitter:
+        depths = np.clip(depths * np.random.uniform(1 - depth_jitter, 1 + depth_jitter, len(depths)),
+                         MIN_DEPTH, MAX_DEPTH)
+    return build_detections(xyxy, confidences, depths, table.lookup(depths), table)
@@ -1,16 +1,21 @@
 import cv2
 import numpy as np
 import torch
-from ultralytics import YOLO
 import logging
 from datetime import datetime
 import os
 import csv
-import glob
 from collections import deque
 import random
 
 from simple_config_v2 import *
+from video_io import next_run_number, read_frame_batches
+from frame_sampler import create_sampler
+from inference_backend import create_backend
+from roi import create_roi
+from overlay import FONT, CachedOverlay, draw_label_lines, text_offset
+from video_shards import process_video_sharded
+from detection_postprocess import DepthCategoryTable, estimate_depth_enhanced, filter_mask, postprocess_boxes
 
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL),
@@ -18,13 +23,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+CSV_HEADER = ['Frame', 'Timestamp', 'Width_px', 'Height_px', 'Depth_cm', 'Category', 'Confidence', 'X1', 'Y1', 'X2', 'Y2', 'Priority']
+
 class EnhancedPotholeDetector:
-    def __init__(self, model_path=MODEL_PATH):
+    def __init__(self, model_path=MODEL_PATH, backend=INFERENCE_BACKEND, threads=None):
         self.model_path = model_path
-        self.device = 'cuda' if torch.cuda.is_available() and USE_GPU else 'cpu'
+        self.backend_name = backend
+        self.device = 'cuda' if torch.cuda.is_available() and USE_GPU and backend == 'ultralytics' and MODEL_PRECISION == 'fp32' else 'cpu'
+        if threads:
+            # One of several processes sharing the CPU (see video_shards.py)
+            torch.set_num_threads(threads)
+            cv2.setNumThreads(threads)
         try:
-            self.model = YOLO(model_path)
-            logger.info(f"Model loaded successfully from {model_path}")
+            self.backend = create_backend(backend, model_path, intra_op_threads=threads or ONNX_INTRA_OP_THREADS)
+            logger.info(f"Model loaded successfully from {model_path} ({self.backend.name} backend)")
             logger.info(f"Using device: {self.device}")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
@@ -33,128 +45,97 @@ class EnhancedPotholeDetector:
         self.total_detections = 0
         self.frame_count = 0
         self.depth_colors = {category: config['color'] for category, config in DEPTH_CATEGORIES.items()}
+        self.category_table = DepthCategoryTable(DEPTH_CATEGORIES)
         self.tracking_buffer = deque(maxlen=TRACKING_BUFFER) if ENABLE_TRACKING else None
         self.previous_detections = []
         self.spatial_filter = SpatialFilter() if SPATIAL_FILTERING else None
+        # Static overlay parts are rendered once and pasted onto each frame
+        self.legend_categories = sorted(DEPTH_CATEGORIES, key=lambda category: DEPTH_CATEGORIES[category]['priority'])
+        self.legend_labels = [f"{category.replace('_', ' ').title()}: " for category in self.legend_categories]
+        self.legend_count_x = [35 + text_offset(label) for label in self.legend_labels]
+        self.legend = CachedOverlay(260, len(self.legend_categories) * 25, self._draw_legend)
+        self.device_label = CachedOverlay(250, 45, self._draw_device_label)
         logger.info("Enhanced Pothole Detector initialized successfully")
 
     def estimate_depth_enhanced(self, bbox_width, bbox_height, frame_width, frame_height, confidence):
-        frame_area = frame_width * frame_height
-        bbox_area = bbox_width * bbox_height
-        normalized_area = bbox_area / frame_area
-        
-        # Method 1: Area-based depth estimation (improved with more realistic scaling)
-        depth_area = max(MIN_DEPTH, MAX_DEPTH - (normalized_area * DEPTH_SCALE_FACTOR * 0.3))
-        
-        # Method 2: Aspect ratio based depth estimation (more realistic)
-        aspect_ratio = bbox_width / bbox_height if bbox_height > 0 else 1.0
-        depth_aspect = max(MIN_DEPTH, 0.25 - (aspect_ratio * 0.05))
-        
-        # Method 3: Size-based depth estimation (improved scaling)
-        avg_size = (bbox_width + bbox_height) / 2
-        depth_size = max(MIN_DEPTH, 0.28 - (avg_size / frame_width * 0.2))
-        
-        # Method 4: Confidence-based depth adjustment
-        confidence_adjustment = 1.0 - (confidence * 0.3)  # Higher confidence = slightly lower depth
-        
-        # Weighted combination with more emphasis on area and size
-        depth_combined = (
-            depth_area * 0.4 +
-            depth_aspect * 0.2 +
-            depth_size * 0.4
-        ) * confidence_adjustment
-        
-        # Apply depth constraints with more realistic upper bound
-        depth_final = max(MIN_DEPTH, min(MAX_DEPTH, depth_combined))
+        depth_final = float(estimate_depth_enhanced(bbox_width, bbox_height, frame_width, frame_height, confidence))
         
         # Add some randomization to create more variety in detections
-        random_factor = random.uniform(0.9, 1.1)
-        depth_final = depth_final * random_factor
+        depth_final = depth_final * random.uniform(0.9, 1.1)
         
         # Ensure final depth is within bounds
-        depth_final = max(MIN_DEPTH, min(MAX_DEPTH, depth_final))
-        
-        # Debug logging for depth estimation
-        if self.total_detections % 50 == 0:
-            logger.debug(f"Depth estimation - Area: {depth_area*100:.1f}cm, "
-                        f"Aspect: {depth_aspect*100:.1f}cm, Size: {depth_size*100:.1f}cm, "
-                        f"Final: {depth_final*100:.1f}cm, Conf: {confidence:.2f}")
-        
-        return depth_final
+        return max(MIN_DEPTH, min(MAX_DEPTH, depth_final))
 
     def get_depth_category_enhanced(self, depth):
-        for category, config in sorted(DEPTH_CATEGORIES.items(), key=lambda x: x[1]['priority']):
-            if depth <= config['max_depth']:
-                return category, self.depth_colors[category]
-        return 'critical', self.depth_colors['critical']
+        return self.category_table.category(depth)
 
     def filter_detections(self, detections, frame_shape):
         if not ENABLE_FILTERING:
             return detections
-        filtered_detections = []
-        for detection in detections:
-            if self.spatial_filter and not self.spatial_filter.is_valid_detection(detection, frame_shape):
-                continue
-            if detection['confidence'] < MIN_DETECTION_CONFIDENCE:
-                continue
-            bbox_width = detection['width']
-            bbox_height = detection['height']
-            if bbox_width < MIN_BBOX_SIZE or bbox_height < MIN_BBOX_SIZE:
-                continue
-            if bbox_width > MAX_BBOX_SIZE or bbox_height > MAX_BBOX_SIZE:
-                continue
-            aspect_ratio = bbox_width / bbox_height if bbox_height > 0 else 1.0
-            if not (ASPECT_RATIO_RANGE[0] <= aspect_ratio <= ASPECT_RATIO_RANGE[1]):
-                continue
-            filtered_detections.append(detection)
-        return filtered_detections
+        if self.spatial_filter:
+            detections = [d for d in detections if self.spatial_filter.is_valid_detection(d, frame_shape)]
+        keep = filter_mask([d['width'] for d in detections], [d['height'] for d in detections],
+                           [d['confidence'] for d in detections])
+        return [detection for detection, valid in zip(detections, keep) if valid]
 
     def detect_potholes_enhanced(self, frame):
-        annotated_frame = frame.copy()
-        detections = []
-        frame_height, frame_width = frame.shape[:2]
+        return self.process_results(frame, self.infer_batch([frame])[0])
+
+    def infer_batch(self, frames, roi=None):
+        """Run the model on a batch of frames with one call per scale.
+
+        Returns, for each frame in input order, the ``(xyxy, confidences)``
+        boxes found at every scale. Only the ``roi`` of each frame (default:
+        a fresh ROI_MODE region) is scaled and sent to the model; boxes are
+        shifted back into the scaled frame.
+        """
+        roi = roi or create_roi(ROI_MODE)
+        crops = [roi.crop(frame) for frame in frames]
         if MULTI_SCALE_DETECTION:
-            all_results = []
+            frame_results = [[] for _ in frames]
             for scale in SCALE_FACTORS:
-                new_width = int(frame_width * scale)
-                new_height = int(frame_height * scale)
-                resized_frame = cv2.resize(frame, (new_width, new_height))
-                results = self.model(resized_frame, verbose=False, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD, show=False)
-                all_results.extend(results)
+                resized_crops = []
+                for crop, _ in crops:
+                    crop_height, crop_width = crop.shape[:2]
+                    resized_crops.append(cv2.resize(crop, (int(crop_width * scale), int(crop_height * scale))))
+                for i, boxes in enumerate(self.backend.predict(resized_crops)):
+                    offset = (int(crops[i][1][0] * scale), int(crops[i][1][1] * scale))
+                    frame_height, frame_width = frames[i].shape[:2]
+                    scaled_shape = (int(frame_height * scale), int(frame_width * scale))
+                    frame_results[i].append(roi.restore(boxes, offset, scaled_shape))
         else:
-            all_results = self.model(frame, verbose=False, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD, show=False)
-        for result in all_results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    if MULTI_SCALE_DETECTION and len(SCALE_FACTORS) > 1:
-                        scale = SCALE_FACTORS[0]
-                        x1 = int(x1 / scale)
-                        y1 = int(y1 / scale)
-                        x2 = int(x2 / scale)
-                        y2 = int(y2 / scale)
-                    confidence = float(box.conf[0].cpu().numpy())
-                    width = x2 - x1
-                    height = y2 - y1
-                    depth = self.estimate_depth_enhanced(width, height, frame_width, frame_height, confidence)
-                    depth_category, color = self.get_depth_category_enhanced(depth)
-                    detection_info = {
-                        'bbox': (x1, y1, x2, y2),
-                        'width': width,
-                        'height': height,
-                        'depth': depth,
-                        'category': depth_category,
-                        'color': color,
-                        'confidence': confidence,
-                        'center': ((x1 + x2) // 2, (y1 + y2) // 2)
-                    }
-                    detections.append(detection_info)
-        filtered_detections = self.filter_detections(detections, frame.shape)
+            outputs = self.backend.predict([crop for crop, _ in crops])
+            frame_results = [[roi.restore(boxes, offset, frame.shape)]
+                             for boxes, (_, offset), frame in zip(outputs, crops, frames)]
+        # The heatmap of an auto ROI learns from the first scale's boxes
+        observed_scale = SCALE_FACTORS[0] if MULTI_SCALE_DETECTION else 1.0
+        for results, frame in zip(frame_results, frames):
+            frame_height, frame_width = frame.shape[:2]
+            roi.observe(results[0][0], (int(frame_height * observed_scale), int(frame_width * observed_scale)))
+        return frame_results
+
+    def process_results(self, frame, boxes, annotate=True):
+        xyxy = np.concatenate([b[0] for b in boxes]) if boxes else np.empty((0, 4), dtype=np.int64)
+        confidences = np.concatenate([b[1] for b in boxes]) if boxes else np.empty(0)
+        if MULTI_SCALE_DETECTION and len(SCALE_FACTORS) > 1:
+            xyxy = (xyxy / SCALE_FACTORS[0]).astype(np.int64)
+        # Depths get +/-10% randomization for more variety in detections
+        filtered_detections = postprocess_boxes(xyxy, confidences, frame.shape, self.category_table, depth_jitter=0.1)
+        if self.spatial_filter and ENABLE_FILTERING:
+            filtered_detections = [d for d in filtered_detections
+                                   if self.spatial_filter.is_valid_detection(d, frame.shape)]
+        if filtered_detections and self.total_detections % 50 == 0:
+            logger.debug(f"Depth estimation - Sample: {filtered_detections[0]['depth']*100:.1f}cm, "
+                         f"Conf: {filtered_detections[0]['confidence']:.2f}")
         for detection in filtered_detections:
             self.detection_stats[detection['category']] += 1
             self.total_detections += 1
+        annotated_frame = self.draw_detections(frame, filtered_detections) if annotate else None
+        return annotated_frame, filtered_detections
+
+    def draw_detections(self, frame, detections):
+        annotated_frame = frame.copy()
+        for detection in detections:
             x1, y1, x2, y2 = detection['bbox']
             color = detection['color']
             thickness = max(1, int(detection['confidence'] * 5))
@@ -165,26 +146,30 @@ class EnhancedPotholeDetector:
                 f"Category: {detection['category']}",
                 f"Conf: {detection['confidence']:.2f}"
             ]
-            text_x = x1
-            text_y = y1 - 10
-            for i, line in enumerate(text_lines):
-                text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-                cv2.rectangle(annotated_frame, (text_x, text_y - text_size[1] - 5), (text_x + text_size[0], text_y + 5), (0, 0, 0), -1)
-                cv2.putText(annotated_frame, line, (text_x, text_y - i * 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        return annotated_frame, filtered_detections
+            draw_label_lines(annotated_frame, text_lines, x1, y1 - 10)
+        return annotated_frame
 
     def add_enhanced_overlay_info(self, frame, frame_count, total_frames, detections):
         height, width = frame.shape[:2]
         cv2.putText(frame, f"Frame: {frame_count}/{total_frames}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         cv2.putText(frame, f"Detections: {len(detections)}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         cv2.putText(frame, f"Total: {self.total_detections}", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        # Swatches and labels are cached, only the counts are drawn per frame
         legend_y = height - 250
-        for i, (category, config) in enumerate(sorted(DEPTH_CATEGORIES.items(), key=lambda x: x[1]['priority'])):
-            color = self.depth_colors[category]
-            cv2.rectangle(frame, (10, legend_y + i * 25), (30, legend_y + i * 25 + 20), color, -1)
-            cv2.putText(frame, f"{category.replace('_', ' ').title()}: {self.detection_stats[category]}", (35, legend_y + i * 25 + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(frame, f"Device: {self.device.upper()}", (width - 200, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(frame, f"Enhanced Detection v2.0", (width - 250, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        self.legend.paste(frame, 10, legend_y)
+        for i, category in enumerate(self.legend_categories):
+            cv2.putText(frame, str(self.detection_stats[category]), (self.legend_count_x[i], legend_y + i * 25 + 15),
+                        FONT, 0.5, (255, 255, 255), 1)
+        self.device_label.paste(frame, width - 250, 15)
+
+    def _draw_legend(self, canvas, key):
+        for i, (category, label) in enumerate(zip(self.legend_categories, self.legend_labels)):
+            cv2.rectangle(canvas, (0, i * 25), (20, i * 25 + 20), self.depth_colors[category], -1)
+            cv2.putText(canvas, label, (25, i * 25 + 15), FONT, 0.5, (255, 255, 255), 1)
+
+    def _draw_device_label(self, canvas, key):
+        cv2.putText(canvas, f"Device: {self.device.upper()}", (50, 15), FONT, 0.5, (255, 255, 255), 1)
+        cv2.putText(canvas, f"Enhanced Detection v2.0", (0, 35), FONT, 0.5, (255, 255, 255), 1)
 
     def process_video_enhanced(self, input_path=INPUT_VIDEO, show_preview=SHOW_PREVIEW):
         cap = cv2.VideoCapture(input_path)
@@ -198,71 +183,94 @@ class EnhancedPotholeDetector:
         logger.info(f"Processing video: {input_path}")
         logger.info(f"Video properties: {width}x{height}, {fps} FPS, {total_frames} frames")
         logger.info(f"Enhanced detection enabled with {len(DEPTH_CATEGORIES)} categories")
+        # Next free run number, from the videos and CSVs of earlier runs
         output_dir = 'output'
-        numbered_pattern = os.path.join(output_dir, 'enhanced_pothole_detection_*.avi')
-        default_video_path = os.path.join(output_dir, 'enhanced_pothole_detection_output.avi')
-        existing_files = glob.glob(numbered_pattern)
-        if os.path.exists(default_video_path):
-            existing_files.append(default_video_path)
-        if not existing_files:
-            video_number = 1
-        else:
-            numbers = []
-            for f in existing_files:
-                base = os.path.basename(f)
-                if base == 'enhanced_pothole_detection_output.avi':
-                    numbers.append(0)
-                else:
-                    num = base.replace('enhanced_pothole_detection_', '').replace('.avi', '')
-                    if num.isdigit():
-                        numbers.append(int(num))
-            video_number = max(numbers) + 1 if numbers else 1
+        video_number = next_run_number(output_dir, ['enhanced_pothole_detection', 'enhanced_pothole_measurements'])
         output_video_path = os.path.join(output_dir, f'enhanced_pothole_detection_{video_number}.avi')
         output_csv_path = os.path.join(output_dir, f'enhanced_pothole_measurements_{video_number}.csv')
         logger.info(f"Video number: {video_number}")
-        logger.info(f"Output video will be saved as: {output_video_path}")
+        if ANNOTATE_OUTPUT:
+            logger.info(f"Output video will be saved as: {output_video_path}")
         logger.info(f"Output CSV will be saved as: {output_csv_path}")
-        output_fps = max(1, fps // 2)
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(output_video_path, fourcc, output_fps, (width, height))
+        workers = SHARD_WORKERS or os.cpu_count() or 1
+        if workers > 1 and total_frames >= SHARD_MIN_FRAMES:
+            cap.release()
+            summaries = process_video_sharded(self, input_path, output_video_path, output_csv_path, total_frames, workers)
+        else:
+            summaries = [self.process_frame_range(cap, output_video_path, output_csv_path)]
+            cap.release()
+        self.print_enhanced_statistics()
+        sampled = sum(summary['sampling']['frames_sampled'] for summary in summaries)
+        seen = sum(summary['sampling']['frames_seen'] for summary in summaries)
+        logger.info(f"Frame sampling ({FRAME_SAMPLING}): {sampled}/{seen} frames, "
+                    f"effective skip {seen / sampled if sampled else 0.0:.2f}")
+        if ROI_MODE != 'none':
+            logger.info(f"ROI: {[summary['roi'] for summary in summaries]}")
+        logger.info(f"Enhanced measurements saved to: {output_csv_path}")
+        if ANNOTATE_OUTPUT:
+            logger.info(f"Enhanced output video saved to: {output_video_path}")
+
+    def process_frame_range(self, cap, output_video_path, output_csv_path, start_frame=0, end_frame=None):
+        """Detect potholes in frames ``start_frame + 1`` .. ``end_frame`` (default: all) of an open capture.
+
+        Writes the annotated video (when ANNOTATE_OUTPUT) and the CSV of
+        that range; returns its sampling and ROI summaries.
+        """
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        out = None
+        if ANNOTATE_OUTPUT:
+            output_fps = max(1, fps // 2) if WRITE_ONLY_SAMPLED_FRAMES else max(1, fps)
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            out = cv2.VideoWriter(output_video_path, fourcc, output_fps, (width, height))
         csv_file = None
         if output_csv_path:
             csv_file = open(output_csv_path, 'w', newline='')
             csv_writer = csv.writer(csv_file)
-            csv_writer.writerow(['Frame', 'Timestamp', 'Width_px', 'Height_px', 'Depth_cm', 'Category', 'Confidence', 'X1', 'Y1', 'X2', 'Y2', 'Priority'])
-        frame_count = 0
+            csv_writer.writerow(CSV_HEADER)
         processed_frames = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame_count += 1
-            if frame_count % FRAME_SKIP != 0:
-                continue
-            processed_frames += 1
-            annotated_frame, detections = self.detect_potholes_enhanced(frame)
-            if csv_file:
-                timestamp = frame_count / fps
-                for detection in detections:
-                    x1, y1, x2, y2 = detection['bbox']
-                    priority = DEPTH_CATEGORIES[detection['category']]['priority']
-                    csv_writer.writerow([
-                        frame_count, f"{timestamp:.2f}", detection['width'], detection['height'],
-                        f"{detection['depth']*100:.1f}", detection['category'], 
-                        f"{detection['confidence']:.3f}", x1, y1, x2, y2, priority
-                    ])
-            self.add_enhanced_overlay_info(annotated_frame, frame_count, total_frames, detections)
-            out.write(annotated_frame)
-            if processed_frames % 30 == 0:
-                progress = (frame_count / total_frames) * 100
-                logger.info(f"Progress: {progress:.1f}% - Detections: {self.total_detections}")
-        cap.release()
-        out.release()
+        sampler = create_sampler(FRAME_SAMPLING, FRAME_SKIP)
+        roi = create_roi(ROI_MODE)
+        detections = []
+        keep_skipped = ANNOTATE_OUTPUT and not WRITE_ONLY_SAMPLED_FRAMES
+        batches = read_frame_batches(cap, BATCH_SIZE, sampler=sampler, keep_skipped=keep_skipped,
+                                     start_frame=start_frame, end_frame=end_frame)
+        for batch in batches:
+            sampled_frames = [frame for _, frame, sampled in batch if sampled]
+            batch_results = iter(self.infer_batch(sampled_frames, roi) if sampled_frames else [])
+            for frame_count, frame, sampled in batch:
+                if not sampled:
+                    # Written between samples with the last detections, never inferred
+                    annotated_frame = self.draw_detections(frame, detections)
+                    self.add_enhanced_overlay_info(annotated_frame, frame_count, total_frames, detections)
+                    out.write(annotated_frame)
+                    continue
+                processed_frames += 1
+                annotated_frame, detections = self.process_results(frame, next(batch_results), annotate=ANNOTATE_OUTPUT)
+                if csv_file:
+                    timestamp = frame_count / fps
+                    for detection in detections:
+                        x1, y1, x2, y2 = detection['bbox']
+                        priority = DEPTH_CATEGORIES[detection['category']]['priority']
+                        csv_writer.writerow([
+                            frame_count, f"{timestamp:.2f}", detection['width'], detection['height'],
+                            f"{detection['depth']*100:.1f}", detection['category'], 
+                            f"{detection['confidence']:.3f}", x1, y1, x2, y2, priority
+                        ])
+                if out is not None:
+                    self.add_enhanced_overlay_info(annotated_frame, frame_count, total_frames, detections)
+                    out.write(annotated_frame)
+                if processed_frames % 30 == 0:
+                    progress = (frame_count / total_frames) * 100
+                    logger.info(f"Progress: {progress:.1f}% - Detections: {self.total_detections}")
+        if out is not None:
+            out.release()
         if csv_file:
             csv_file.close()
-        self.print_enhanced_statistics()
-        logger.info(f"Enhanced measurements saved to: {output_csv_path}")
-        logger.info(f"Enhanced output video saved to: {output_video_path}")
+        self.frame_count += processed_frames
+        return {'sampling': sampler.summary(), 'roi': roi.summary()}
 
     def print_enhanced_statistics(self):
         logger.info("\n" + "="*60)
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+from simple_config_v2 import (
+    FRAME_SAMPLING, MOTION_TARGET, MOTION_MIN_SKIP, MOTION_MAX_SKIP, MOTION_DOWNSCALE_WIDTH
+)
+
+
+class FixedSampler:
+    """Samples every ``frame_skip``-th frame (the classic FRAME_SKIP gate).
+
+    ``needs_frame`` tells frame sources whether ``accept`` looks at the
+    pixels; when it doesn't, skipped frames never have to be decoded.
+    """
+
+    needs_frame = False
+
+    def __init__(self, frame_skip=1):
+        self.frame_skip = max(1, frame_skip)
+        self.seen = 0
+        self.sampled = 0
+
+    def accept(self, frame_number, frame):
+        """Whether frame ``frame_number`` (1-based) should be run through the model"""
+        self.seen += 1
+        if frame_number % self.frame_skip != 0:
+            return False
+        self.sampled += 1
+        return True
+
+    @property
+    def effective_skip(self):
+        """Frames seen per frame sampled"""
+        return self.seen / self.sampled if self.sampled else 0.0
+
+    def summary(self):
+        return {'frames_seen': self.seen, 'frames_sampled': self.sampled,
+                'effective_skip': round(self.effective_skip, 2)}
+
+
+class MotionAdaptiveSampler(FixedSampler):
+    """Samples a frame each time the road has moved ``target_motion`` of the view.
+
+    Motion is the vertical shift of the lower half of the frame (the road
+    just ahead of the camera) between consecutive frames, estimated with
+    phase correlation on a small grayscale copy. Shifts accumulate until
+    they reach ``target_motion`` (a fraction of that half's height), so a
+    stopped car is sampled only every ``max_skip`` frames while fast driving
+    is sampled as often as every ``min_skip`` frames, keeping the road
+    coverage between samples roughly constant.
+    """
+
+    needs_frame = True
+
+    def __init__(self, target_motion=MOTION_TARGET, min_skip=MOTION_MIN_SKIP, max_skip=MOTION_MAX_SKIP,
+                 downscale_width=MOTION_DOWNSCALE_WIDTH):
+        super().__init__(1)
+        self.target_motion = target_motion
+        self.min_skip = max(1, min_skip)
+        self.max_skip = max(self.min_skip, max_skip)
+        self.downscale_width = downscale_width
+        self._previous = None
+        self._window = None
+        self._motion = 0.0
+        self._since_sample = 0
+
+    def accept(self, frame_number, frame):
+        self.seen += 1
+        self._since_sample += 1
+        current = self._road_patch(frame)
+        if self._previous is not None:
+            (_, shift_y), _ = cv2.phaseCorrelate(self._previous, current, self._window)
+            self._motion += abs(shift_y) / current.shape[0]
+        self._previous = current
+
+        first = self.sampled == 0
+        if not first and self._since_sample < self.min_skip:
+            return False
+        if first or self._motion >= self.target_motion or self._since_sample >= self.max_skip:
+            self.sampled += 1
+            self._motion = 0.0
+            self._since_sample = 0
+            return True
+        return False
+
+    def _road_patch(self, frame):
+        """Small float32 grayscale copy of the lower half of the frame"""
+        height, width = frame.shape[:2]
+        lower = frame[height // 2:]
+        scale = self.downscale_width / width
+        small = cv2.resize(lower, (self.downscale_width, max(8, int(lower.shape[0] * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        patch = gray.astype(np.float32)
+        if self._window is None or self._window.shape[::-1] != patch.shape[::-1]:
+            self._window = cv2.createHanningWindow(patch.shape[::-1], cv2.CV_32F)
+        return patch
+
+
+def create_sampler(mode=FRAME_SAMPLING, frame_skip=1):
+    """Frame sampler by name: 'fixed' (every ``frame_skip``-th frame) or 'motion'"""
+    if mode == 'fixed':
+        return FixedSampler(frame_skip)
+    if mode == 'motion':
+        return MotionAdaptiveSampler()
+    raise ValueError(f"Unknown frame sampling mode: {mode}")
@@ -0,0 +1,60 @@
+# Gunicorn configuration for the pothole detection web app
+#
+# With preload_app the master imports web_app (and loads best.pt) once before
+# forking, so the model weights live in copy-on-write pages shared by every
+# worker instead of one private copy per worker.
+
+import gc
+import os
+import multiprocessing
+
+from simple_config_v2 import WEB_WORKERS, WEB_THREADS, PRELOAD_MODEL, TORCH_THREADS_PER_WORKER
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', WEB_WORKERS))
+# Threaded workers: one loaded model serves several in-flight requests per
+# process (detection state is per call), and Server-Sent Events streams don't
+# tie up a whole process
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', WEB_THREADS))
+preload_app = os.environ.get('PRELOAD_MODEL', '1' if PRELOAD_MODEL else '0') == '1'
+timeout = 120
+pidfile = os.environ.get('GUNICORN_PID_FILE', '/tmp/gunicorn.pid')
+
+if preload_app:
+    # The master loads the model before forking. Keep torch single threaded
+    # there: an OpenMP pool started before fork() can deadlock in the children.
+    import torch
+    torch.set_num_threads(1)
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before any fork"""
+    if not server.cfg.preload_app:
+        return
+    from web_app import detector
+    detector.prepare_for_fork()
+    # Move everything allocated so far into the permanent GC generation, so
+    # collections in the workers don't write to (and un-share) those pages.
+    gc.freeze()
+    server.log.info("Model preloaded in master, workers will share its memory")
+
+
+def worker_threads(server):
+    return TORCH_THREADS_PER_WORKER or max(1, multiprocessing.cpu_count() // server.cfg.workers)
+
+
+def post_fork(server, worker):
+    """Size torch's thread pool per worker; the pool is never started in the master"""
+    import cv2
+    import torch
+    threads = worker_threads(server)
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    server.log.info(f"Worker {worker.pid} using {threads} torch threads")
+
+
+def post_worker_init(worker):
+    """Size the ONNX session's intra-op pool per worker (created lazily in the worker itself)"""
+    from web_app import detector
+    detector.backend.set_threads(worker_threads(worker))
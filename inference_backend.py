@@ -0,0 +1,266 @@
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from simple_config_v2 import (
+    MODEL_PATH, MODEL_PRECISION, CONFIDENCE_THRESHOLD, NMS_THRESHOLD, INFERENCE_BACKEND, ONNX_MODEL_PATH,
+    ONNX_IMAGE_SIZE, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS, INFERENCE_SIZE
+)
+from detection_postprocess import extract_boxes
+from preprocess import ResizedBackend
+
+try:
+    import onnxruntime
+except ImportError:  # Only needed for the 'onnx' backend
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+# Ultralytics defaults for settings the detectors don't override
+DEFAULT_IOU = 0.7
+MAX_DETECTIONS = 300
+STRIDE = 32
+
+
+class UltralyticsBackend:
+    """Runs the YOLO ``.pt`` model through ultralytics / torch.
+
+    ``predict(frames)`` returns one ``(xyxy int array, confidence array)``
+    pair per frame, in original frame coordinates. ``imgsz`` is the size
+    ultralytics letterboxes to (None = its default, 640).
+    """
+
+    name = 'ultralytics'
+
+    def __init__(self, model_path=MODEL_PATH, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD, imgsz=None):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+
+    def predict(self, frames):
+        kwargs = {'verbose': False, 'conf': self.conf, 'show': False}
+        if self.iou is not None:
+            kwargs['iou'] = self.iou
+        if self.imgsz:
+            kwargs['imgsz'] = self.imgsz
+        return [extract_boxes(result) for result in self.model(frames, **kwargs)]
+
+    def prepare_for_fork(self):
+        """Fuse Conv+BN now instead of lazily on the first prediction"""
+        self.model.fuse()
+        self.model.model.eval()
+
+    def set_threads(self, threads):
+        """Torch's pool is sized process-wide with torch.set_num_threads"""
+        pass
+
+
+class OnnxBackend:
+    """Runs the model exported to ONNX through onnxruntime on the CPU.
+
+    Pre- and post-processing mirror ultralytics (letterbox with grey
+    padding, confidence filter, class-aware NMS, boxes scaled back to the
+    frame) so detections match the torch backend.
+
+    With an INT8 ``precision`` the exported model is quantized once (see
+    quantization.py) and the quantized copy is loaded instead.
+
+    ``imgsz`` is the export size; ``input_size`` letterboxes to another
+    size instead when the model was exported with dynamic shapes.
+
+    The session (and its thread pools) is created on first use in each
+    process: onnxruntime sessions must not be inherited across fork().
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path=MODEL_PATH, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD, onnx_path=ONNX_MODEL_PATH,
+                 imgsz=ONNX_IMAGE_SIZE, intra_op_threads=ONNX_INTRA_OP_THREADS, inter_op_threads=ONNX_INTER_OP_THREADS,
+                 precision=MODEL_PRECISION, input_size=None):
+        if onnxruntime is None:
+            raise ImportError("The 'onnx' inference backend needs onnxruntime (pip install onnxruntime)")
+        self.conf = conf
+        self.iou = DEFAULT_IOU if iou is None else iou
+        self.imgsz = imgsz
+        self.precision = precision
+        self.onnx_path = export_onnx(model_path, onnx_path or None, imgsz)
+        if precision != 'fp32':
+            from quantization import quantize_model
+            self.onnx_path = quantize_model(self.onnx_path, precision, imgsz=imgsz)
+
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.requested_input_size = input_size
+        self._session = None
+        self._session_pid = None
+
+    @property
+    def session(self):
+        """This process' InferenceSession, created on first use"""
+        if self._session is None or self._session_pid != os.getpid():
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.intra_op_threads:
+                options.intra_op_num_threads = self.intra_op_threads
+            if self.inter_op_threads:
+                options.inter_op_num_threads = self.inter_op_threads
+            session = onnxruntime.InferenceSession(self.onnx_path, options, providers=['CPUExecutionProvider'])
+            model_input = session.get_inputs()[0]
+            self.input_name = model_input.name
+            # Exported with dynamic axes the spatial size can shrink to the frame's aspect ratio
+            self.dynamic = not all(isinstance(dim, int) for dim in model_input.shape[2:])
+            input_size = self.requested_input_size
+            self.input_size = input_size if input_size and self.dynamic else self.imgsz
+            if input_size and not self.dynamic:
+                logger.warning(f"{self.onnx_path} has a fixed input shape, running at {self.imgsz} instead of {input_size}")
+            self._session, self._session_pid = session, os.getpid()
+            logger.info(f"ONNX Runtime session ready for {self.onnx_path} in process {self._session_pid} "
+                        f"(dynamic shapes: {self.dynamic}, intra-op threads: {self.intra_op_threads or 'default'})")
+        return self._session
+
+    def predict(self, frames):
+        session = self.session
+        prepared = [letterbox(frame, self.input_size, auto=self.dynamic) for frame in frames]
+        outputs = [None] * len(frames)
+        # Frames sharing a letterboxed shape (all frames of a video) run as one batch
+        groups = {}
+        for i, (image, _, _) in enumerate(prepared):
+            groups.setdefault(image.shape, []).append(i)
+        for indices in groups.values():
+            batch = to_input_tensor([prepared[i][0] for i in indices])
+            predictions = session.run(None, {self.input_name: batch})[0]
+            for i, prediction in zip(indices, predictions):
+                _, gain, pad = prepared[i]
+                outputs[i] = self._postprocess(prediction, gain, pad, frames[i].shape)
+        return outputs
+
+    def prepare_for_fork(self):
+        """Drop a session created in this process so it isn't inherited by forked workers"""
+        self._session = None
+
+    def set_threads(self, threads):
+        """Size the intra-op pool of sessions created from now on (0 = onnxruntime default)"""
+        if threads != self.intra_op_threads:
+            self.intra_op_threads = threads
+            self._session = None
+
+    def _postprocess(self, prediction, gain, pad, frame_shape):
+        """``(4 + classes, anchors)`` YOLOv8 output -> boxes in frame coordinates"""
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+        keep = confidences > self.conf
+        boxes = xywh_to_xyxy(prediction[keep, :4])
+        confidences = confidences[keep]
+        classes = classes[keep]
+
+        keep = nms(boxes, confidences, classes, self.iou)[:MAX_DETECTIONS]
+        boxes = boxes[keep]
+        confidences = confidences[keep]
+
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+        return boxes.astype(np.int64), confidences.astype(np.float64)
+
+
+def export_onnx(model_path, onnx_path=None, imgsz=640):
+    """Export the ``.pt`` model to ONNX once; reused while newer than the weights"""
+    onnx_path = onnx_path or os.path.splitext(model_path)[0] + '.onnx'
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(model_path):
+        return onnx_path
+    from ultralytics import YOLO
+    logger.info(f"Exporting {model_path} to ONNX (imgsz={imgsz})")
+    exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=False)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+def letterbox(frame, imgsz, auto=False, color=(114, 114, 114)):
+    """Resize keeping the aspect ratio and pad to ``imgsz`` (or the next stride multiple).
+
+    Returns ``(image, gain, (pad_x, pad_y))`` like ultralytics' LetterBox.
+    """
+    height, width = frame.shape[:2]
+    gain = min(imgsz / height, imgsz / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    pad_x, pad_y = imgsz - new_width, imgsz - new_height
+    if auto:
+        pad_x, pad_y = pad_x % STRIDE, pad_y % STRIDE
+    pad_x /= 2
+    pad_y /= 2
+    if (new_width, new_height) != (width, height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, gain, (left, top)
+
+
+def to_input_tensor(images):
+    """Letterboxed BGR images -> normalized RGB NCHW float32 batch"""
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+def xywh_to_xyxy(boxes):
+    xyxy = np.empty_like(boxes)
+    xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+    xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+    xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+    xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+    return xyxy
+
+
+def nms(boxes, scores, classes, iou_threshold):
+    """Greedy class-aware non-maximum suppression; indices by descending score"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Offsetting boxes per class keeps different classes from suppressing each other
+    offset = boxes + classes[:, None].astype(boxes.dtype) * 7680
+    areas = (offset[:, 2] - offset[:, 0]) * (offset[:, 3] - offset[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        x1 = np.maximum(offset[i, 0], offset[rest, 0])
+        y1 = np.maximum(offset[i, 1], offset[rest, 1])
+        x2 = np.minimum(offset[i, 2], offset[rest, 2])
+        y2 = np.minimum(offset[i, 3], offset[rest, 3])
+        intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = intersection / (areas[i] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def create_backend(name=INFERENCE_BACKEND, model_path=MODEL_PATH, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD,
+                   precision=MODEL_PRECISION, inference_size=INFERENCE_SIZE, intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """Inference backend by name: 'ultralytics' (torch) or 'onnx' (onnxruntime).
+
+    With an ``inference_size`` frames are downscaled to it before inference
+    and boxes mapped back to the original frames (see preprocess.py).
+    """
+    if precision != 'fp32' and name != 'onnx':
+        logger.info(f"MODEL_PRECISION '{precision}' runs on the ONNX backend, ignoring INFERENCE_BACKEND '{name}'")
+        name = 'onnx'
+    if name == 'ultralytics':
+        backend = UltralyticsBackend(model_path, conf, iou, imgsz=inference_size or None)
+    elif name == 'onnx':
+        backend = OnnxBackend(model_path, conf, iou, intra_op_threads=intra_op_threads, precision=precision,
+                              input_size=inference_size or None)
+    else:
+        raise ValueError(f"Unknown inference backend: {name}")
+    if inference_size:
+        logger.info(f"Running inference at {inference_size}px")
+        return ResizedBackend(backend, inference_size)
+    return backend
@@ -0,0 +1,368 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be accepted"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation was requested"""
+
+
+class Job:
+    def __init__(self, job_id, filename):
+        self.id = job_id
+        self.filename = filename
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.progress = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.last_progress_at = None
+        # Process running the job, lets other workers notice when it died
+        self.pid = os.getpid()
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls(state['job_id'], state['filename'])
+        for key in ('status', 'result', 'error', 'progress', 'created_at', 'started_at',
+                    'finished_at', 'last_progress_at', 'pid'):
+            setattr(job, key, state.get(key))
+        return job
+
+    def state(self):
+        """Full job state including the result, as persisted to disk"""
+        state = self.to_dict()
+        state['result'] = self.result
+        state['pid'] = self.pid
+        return state
+
+    def to_dict(self):
+        """Serializable view of the job state (without the result payload)"""
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'error': self.error,
+            'progress': self.progress,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'last_progress_at': self.last_progress_at
+        }
+
+
+class EventBroker:
+    """Lightweight in-process pub/sub of job events.
+
+    Every subscriber gets its own bounded queue; a subscriber that falls
+    behind loses its oldest events rather than blocking the publisher.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        subscription = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, topic, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(topic)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event, data))
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscription.put_nowait((event, data))
+                except queue.Full:
+                    pass
+
+
+class JobManager:
+    """Bounded background worker pool for long running uploads.
+
+    At most ``max_pending`` jobs (queued + running) are accepted at a time,
+    ``max_workers`` of them run concurrently. Finished jobs are kept in memory
+    for ``result_ttl`` seconds so clients can poll for their results.
+
+    When ``state_dir`` is given every state change is also written there as
+    ``<job_id>.json``, so any process sharing the directory (e.g. the other
+    gunicorn workers) can report on the job.
+
+    Job functions are called as ``func(job, *args)``; they report progress
+    through :meth:`report_progress` and should stop by raising
+    :class:`JobCancelled` once :meth:`is_cancelled` returns True. A job
+    cancelled while still queued never calls ``func``; its ``cleanup(job, *args)``
+    runs instead, to release what was set aside for it. Status and
+    progress changes are published on ``events`` under the job id, and
+    ``on_finish(job)`` is called once a job reached its final status.
+    State files of finished (or abandoned) jobs are removed from
+    ``state_dir`` once they are older than ``result_ttl``.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, result_ttl=3600, state_dir=None,
+                 stall_timeout=60, persist_interval=2.0, on_finish=None):
+        self.result_ttl = result_ttl
+        self.on_finish = on_finish
+        self.state_dir = state_dir
+        self.stall_timeout = stall_timeout
+        self.persist_interval = persist_interval
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self.events = EventBroker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pothole-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = {}
+        self._last_saved = {}
+        self._last_state_sweep = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_job_id():
+        return uuid.uuid4().hex
+
+    def submit(self, func, *args, filename=None, job_id=None, cleanup=None):
+        """Queue ``func(job, *args)`` and return the Job tracking it"""
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull("Too many jobs in progress, try again later")
+
+        job = Job(job_id or self.new_job_id(), filename)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._save(job)
+
+        try:
+            self._executor.submit(self._run, job, func, args, cleanup)
+        except Exception:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            self._slots.release()
+            raise
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load(job_id)
+        return job
+
+    def is_local(self, job):
+        """Whether the job runs in this process (and publishes events here)"""
+        with self._lock:
+            return self._jobs.get(job.id) is job
+
+    def status(self, job):
+        """Job state for clients, flagging running jobs without recent progress"""
+        status = job.to_dict()
+        last_activity = job.last_progress_at or job.started_at
+        status['stalled'] = (job.status == 'running' and last_activity is not None and
+                             time.time() - last_activity > self.stall_timeout)
+        return status
+
+    def is_active(self, job):
+        """Whether a job is still queued or running and can be expected to finish.
+
+        Jobs of a process that died (OOM, worker restart) keep their last
+        persisted status forever; they count as inactive once their process
+        is gone or, while running, they stalled.
+        """
+        if job.finished:
+            return False
+        return self.is_local(job) or self._owner_alive(job)
+
+    def _owner_alive(self, job):
+        return pid_alive(job.pid) and not self.status(job)['stalled']
+
+    def count(self, status):
+        """Number of jobs of this process currently in ``status``"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def report_progress(self, job, progress):
+        """Record and publish the progress of a running job"""
+        job.progress = progress
+        job.last_progress_at = time.time()
+        self.events.publish(job.id, 'progress', progress)
+        if job.last_progress_at - self._last_saved.get(job.id, 0) >= self.persist_interval:
+            self._save(job)
+
+    def cancel(self, job_id):
+        """Request cancellation; returns False for unknown or finished jobs"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        if self.is_local(job):
+            job.cancel_event.set()
+        elif self.state_dir:
+            # Running in another worker, leave a marker it polls for
+            open(self._cancel_path(job_id), 'w').close()
+        return True
+
+    def is_cancelled(self, job):
+        if job.cancel_event.is_set():
+            return True
+        if self.state_dir and os.path.exists(self._cancel_path(job.id)):
+            job.cancel_event.set()
+            return True
+        return False
+
+    def _run(self, job, func, args, cleanup=None):
+        if self.is_cancelled(job):
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            try:
+                if cleanup:
+                    cleanup(job, *args)
+            except Exception as e:
+                logger.error(f"Cleanup of cancelled job {job.id} failed: {e}")
+            finally:
+                self._finish(job)
+            return
+
+        job.status = 'running'
+        job.started_at = time.time()
+        self._save(job)
+        self.events.publish(job.id, 'status', job.to_dict())
+        try:
+            job.result = func(job, *args)
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            self._finish(job)
+            logger.info(f"Job {job.id} {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+    def _finish(self, job):
+        self._save(job)
+        self._last_saved.pop(job.id, None)
+        self._slots.release()
+        if self.state_dir:
+            try:
+                os.remove(self._cancel_path(job.id))
+            except OSError:
+                pass
+        self.events.publish(job.id, 'status', job.to_dict())
+        if self.on_finish:
+            self.on_finish(job)
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL (caller holds the lock)"""
+        cutoff = time.time() - self.result_ttl
+        if self.state_dir and time.time() - self._last_state_sweep >= self.stall_timeout:
+            self._last_state_sweep = time.time()
+            self._sweep_state_files(cutoff)
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            if self.state_dir:
+                try:
+                    os.remove(self._state_path(job_id))
+                except OSError:
+                    pass
+
+    def _sweep_state_files(self, cutoff):
+        """Remove state files (of any process) not written since ``cutoff`` whose job is no longer active"""
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                job_id, extension = os.path.splitext(name)
+                if extension == '.json' and job_id not in self._jobs:
+                    job = self._load(job_id)
+                    # Jobs of this process are in _jobs, so the caller's lock isn't needed here
+                    if job is not None and not job.finished and self._owner_alive(job):
+                        continue
+                elif extension == '.json':
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.cancel")
+
+    def _save(self, job):
+        if not self.state_dir:
+            return
+        path = self._state_path(job.id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(job.state(), f)
+            os.replace(tmp_path, path)
+            self._last_saved[job.id] = time.time()
+        except (OSError, TypeError) as e:
+            logger.warning(f"Could not persist state of job {job.id}: {e}")
+
+    def _load(self, job_id):
+        """Job state written by another process, if any"""
+        if not self.state_dir or not job_id.isalnum():
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return Job.from_state(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+
+def pid_alive(pid):
+    """Whether a process with this pid exists (on this host)"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to another user
+        return True
+    return True
@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+class LatestFrame:
+    """Single slot holding the newest frame pushed by a live client.
+
+    A receiving thread ``put``s every incoming frame; the detection loop
+    ``take``s whatever is newest. Frames overwritten before they were
+    taken are stale and counted in ``dropped`` instead of queueing up
+    behind a busy model.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, data):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self.received += 1
+            self._item = (self.received, data, time.perf_counter())
+            self._condition.notify()
+
+    def take(self):
+        """``(sequence_number, data, received_at)`` of the newest frame, None once closed and drained"""
+        with self._condition:
+            while self._item is None and not self._closed:
+                self._condition.wait()
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
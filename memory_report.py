@@ -0,0 +1,84 @@
+"""Report shared vs unique memory of the gunicorn master and its workers.
+
+Usage:
+    python memory_report.py                # reads the pid from /tmp/gunicorn.pid
+    python memory_report.py --pid 1234     # explicit master pid
+
+Unique (private) pages are what each extra worker really costs; shared pages
+are the copy-on-write memory inherited from the preloaded master. PSS splits
+shared pages evenly between the processes mapping them, so the PSS total is
+the actual footprint of the whole server.
+"""
+import argparse
+import os
+
+FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap')
+
+
+def read_smaps_rollup(pid):
+    """Memory counters of a process in kB (Linux /proc/<pid>/smaps_rollup)"""
+    values = {field: 0 for field in FIELDS}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(':')
+            if key in values:
+                values[key] = int(parts[1])
+    return values
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, the ppid follows the closing parenthesis
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def memory_report(master_pid):
+    """Per-process rows of (pid, role, counters) for the master and its workers"""
+    rows = [(master_pid, 'master', read_smaps_rollup(master_pid))]
+    for pid in child_pids(master_pid):
+        rows.append((pid, 'worker', read_smaps_rollup(pid)))
+    return rows
+
+
+def print_report(rows):
+    mb = lambda kb: kb / 1024
+    print(f"{'PID':>8} {'Role':<7} {'RSS MB':>9} {'PSS MB':>9} {'Shared MB':>10} {'Unique MB':>10}")
+    print("-" * 58)
+    total_rss = total_pss = 0
+    for pid, role, m in rows:
+        shared = m['Shared_Clean'] + m['Shared_Dirty']
+        unique = m['Private_Clean'] + m['Private_Dirty']
+        total_rss += m['Rss']
+        total_pss += m['Pss']
+        print(f"{pid:>8} {role:<7} {mb(m['Rss']):>9.1f} {mb(m['Pss']):>9.1f} {mb(shared):>10.1f} {mb(unique):>10.1f}")
+    print("-" * 58)
+    print(f"Sum of RSS (double counts shared pages): {mb(total_rss):.1f} MB")
+    print(f"Sum of PSS (actual footprint):           {mb(total_pss):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pid', type=int, help='gunicorn master pid')
+    parser.add_argument('--pid-file', default=os.environ.get('GUNICORN_PID_FILE', '/tmp/gunicorn.pid'))
+    args = parser.parse_args()
+
+    master_pid = args.pid
+    if master_pid is None:
+        with open(args.pid_file) as f:
+            master_pid = int(f.read().strip())
+    print_report(memory_report(master_pid))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""Minimal in-process metrics registry rendered in the Prometheus text format.
+
+Instruments are created once (usually at import time) and their labelled
+children can be bound ahead of time, so recording a value in a hot loop is
+a lock plus an addition::
+
+    STAGE_SECONDS = REGISTRY.histogram('stage_seconds', 'Time per stage', ['stage'])
+    INFERENCE = STAGE_SECONDS.labels('inference')
+    with INFERENCE.time():
+        ...
+
+Every process keeps its own registry. Under gunicorn, where a scrape
+lands on whichever worker accepts it, :class:`SharedMetrics` has each
+process publish snapshots to a shared directory and renders their sum.
+"""
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from jobs import pid_alive
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    def __init__(self):
+        super().__init__()
+        self._function = None
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def set_function(self, function):
+        """Compute the value when metrics are collected instead of tracking it"""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function else self.value
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Child for one combination of label values (cache it in hot paths)"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels, use .labels() first")
+        return self._children[()]
+
+    def snapshot(self):
+        """JSON-serializable description and values, see :meth:`Registry.merge`"""
+        return {'kind': self.kind, 'documentation': self.documentation, 'labelnames': list(self.labelnames),
+                'samples': [[list(values), self._value(child)] for values, child in list(self._children.items())]}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def _value(self, child):
+        return child.value
+
+    def _merge(self, child, value):
+        child.inc(value)
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled().dec(amount)
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+    def set_function(self, function):
+        self._unlabelled().set_function(function)
+
+    def _value(self, child):
+        return child.get()
+
+    def _merge(self, child, value):
+        child.inc(value)
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def snapshot(self):
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+    def _value(self, child):
+        with child._lock:
+            return [list(child.counts), child.sum]
+
+    def _merge(self, child, value):
+        counts, total = value
+        with child._lock:
+            child.counts = [a + b for a, b in zip(child.counts, counts)]
+            child.sum += total
+
+    def _samples(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        names = self.labelnames + ('le',)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(names, values + (_format_value(bound),))} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    @classmethod
+    def merge(cls, snapshots):
+        """Registry holding the sum of several processes' snapshots"""
+        registry = cls()
+        kinds = {'counter': registry.counter, 'gauge': registry.gauge}
+        for snapshot in snapshots:
+            for name, data in snapshot.items():
+                metric = registry._metrics.get(name)
+                if metric is None:
+                    if data['kind'] == 'histogram':
+                        metric = registry.histogram(name, data['documentation'], data['labelnames'], data['buckets'])
+                    else:
+                        metric = kinds[data['kind']](name, data['documentation'], data['labelnames'])
+                for values, value in data['samples']:
+                    metric._merge(metric.labels(*values), value)
+        return registry
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def timed_iter(iterable, histogram):
+    """Yield the items of ``iterable``, observing how long each one took to produce"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        histogram.observe(time.perf_counter() - start)
+        yield item
+
+
+class SharedMetrics:
+    """Metrics of every process sharing ``directory`` (e.g. all gunicorn workers).
+
+    Each process writes a snapshot of ``registry`` to ``<pid>.json`` every
+    ``interval`` seconds (and whenever it renders); :meth:`render` sums the
+    snapshots of the processes still running. Snapshots of processes that
+    exited (restarted workers, earlier runs) are removed, so totals restart
+    with their worker like any Prometheus counter.
+    """
+
+    def __init__(self, registry, directory, interval=5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._thread = None
+        self._thread_pid = None
+
+    def start(self):
+        """Start publishing this process' snapshots (once per process, safe to call often)"""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='metrics-publisher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                logger.warning(f"Could not publish metrics: {e}")
+            time.sleep(self.interval)
+
+    def publish(self):
+        # Created here, not once: gunicorn's on_starting clears it after the app was preloaded
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def render(self):
+        try:
+            self.publish()
+        except OSError as e:
+            logger.warning(f"Could not publish metrics, reporting this process only: {e}")
+            return self.registry.render()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = os.path.splitext(os.path.basename(path))[0]
+            if not (pid.isdigit() and pid_alive(int(pid))):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return Registry.merge(snapshots).render()
+
+
+REGISTRY = Registry()
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+@lru_cache(maxsize=4096)
+def text_size(text, scale=0.5, thickness=1):
+    """``(width, height)`` of a text line, measured once per distinct line"""
+    return cv2.getTextSize(text, FONT, scale, thickness)[0]
+
+
+def text_offset(prefix, scale=0.5, thickness=1):
+    """x offset where text continuing ``prefix`` starts, to draw a changing suffix on its own"""
+    return text_size(prefix + '0', scale, thickness)[0] - text_size('0', scale, thickness)[0]
+
+
+def draw_label_lines(frame, lines, x, y, scale=0.5, line_height=15):
+    """White label lines on black boxes, stacked upwards from ``(x, y)``"""
+    for i, line in enumerate(lines):
+        width, height = text_size(line, scale)
+        cv2.rectangle(frame, (x, y - height - 5), (x + width, y + 5), (0, 0, 0), -1)
+        cv2.putText(frame, line, (x, y - i * line_height), FONT, scale, (255, 255, 255), 1)
+
+
+class CachedOverlay:
+    """A ``width`` x ``height`` panel drawn once and copied onto every frame.
+
+    ``draw(canvas, key)`` renders the panel in its own coordinates; it is
+    only called again when ``key`` changes. Rendering costs several direct
+    draws, so keep changing values (counters) out of the panel and draw
+    them on the frame instead.
+    Only the pixels ``draw`` paints are copied (through a mask), so boxes
+    and road around the text stay visible as with direct drawing; text
+    edges OpenCV anti-aliases come out solid where at least half covered.
+    A masked copy is cheaper than laying out every text line again.
+    """
+
+    def __init__(self, width, height, draw):
+        self.width = width
+        self.height = height
+        self.draw = draw
+        self._key = None
+        self._panel = None
+        self._mask = None
+
+    def paste(self, frame, x, y, key=None):
+        if self._panel is None or key != self._key:
+            self._render(key)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(frame.shape[1], x + self.width), min(frame.shape[0], y + self.height)
+        if x1 > x0 and y1 > y0:
+            cv2.copyTo(self._panel[y0 - y:y1 - y, x0 - x:x1 - x], self._mask[y0 - y:y1 - y, x0 - x:x1 - x],
+                       frame[y0:y1, x0:x1])
+
+    def _render(self, key):
+        # Drawn on black and on white: the difference is how much of each pixel was painted
+        black = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        white = np.full_like(black, 255)
+        self.draw(black, key)
+        self.draw(white, key)
+        coverage = (255 - (white.astype(np.int16) - black)).max(axis=2, keepdims=True)
+        self._panel = (black.astype(np.int32) * 255 // np.maximum(coverage, 1)).clip(0, 255).astype(np.uint8)
+        self._mask = (coverage[..., 0] >= 128).astype(np.uint8)
+        self._key = key
@@ -0,0 +1,176 @@
+import queue
+import threading
+
+_END = object()
+_STOPPED = object()
+
+
+class WeightedQueue:
+    """FIFO queue bounded by the total ``weight(item)`` it holds (e.g. frames, not batches).
+
+    An item heavier than the whole capacity is still accepted once the
+    queue is empty, so oversized items pass one at a time. Markers such as
+    the end of input weigh nothing.
+    """
+
+    def __init__(self, capacity, weight):
+        self.capacity = capacity
+        self.weight = weight
+        self._items = []
+        self._total = 0
+        self._condition = threading.Condition()
+
+    def _weigh(self, item):
+        return 0 if item is _END else self.weight(item)
+
+    def put(self, item, timeout=None):
+        weight = self._weigh(item)
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: not self._items or self._total + weight <= self.capacity, timeout):
+                raise queue.Full
+            self._items.append((item, weight))
+            self._total += weight
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item, weight = self._items.pop(0)
+            self._total -= weight
+            self._condition.notify_all()
+            return item
+
+
+class Pipeline:
+    """Threaded stages connected by bounded FIFO queues.
+
+    Each queue has exactly one consumer, so items leave every stage in the
+    order they entered it. The first exception raised by any stage stops the
+    whole pipeline and is re-raised in the calling thread.
+
+    Queues hold ``queue_size`` items, or with a ``weight`` function up to
+    that total weight, e.g. ``weight=len`` bounds queues of frame batches
+    by the number of frames in them.
+
+    Typical use::
+
+        pipeline = Pipeline(queue_size=4)
+        items = pipeline.source(read_items(), 'decode')
+        results = pipeline.queue()
+        pipeline.consumer(results, write_result, 'write')
+        try:
+            for item in pipeline.iterate(items):
+                pipeline.put(results, process(item))
+            pipeline.finish([results])
+        except BaseException:
+            pipeline.abort()
+            raise
+    """
+
+    def __init__(self, queue_size=4):
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._threads = []
+        self._error = None
+
+    def queue(self, size=None, weight=None):
+        """Queue of ``size`` items (default ``queue_size``), or ``size`` total ``weight(item)``"""
+        size = size or self.queue_size
+        if weight is not None:
+            return WeightedQueue(size, weight)
+        return queue.Queue(maxsize=size)
+
+    def source(self, iterable, name, size=None, weight=None):
+        """Drain ``iterable`` in a background thread, returning its output queue"""
+        out_queue = self.queue(size, weight)
+
+        def run():
+            for item in iterable:
+                if not self._put(out_queue, item):
+                    return
+            self._put(out_queue, _END)
+
+        self._start(run, name)
+        return out_queue
+
+    def consumer(self, in_queue, func, name):
+        """Call ``func(item)`` for every item of ``in_queue`` in a background thread"""
+        def run():
+            while True:
+                item = self._get(in_queue)
+                if item is _END or item is _STOPPED:
+                    return
+                func(item)
+
+        self._start(run, name)
+
+    def iterate(self, in_queue):
+        """Consume a queue in the calling thread"""
+        while True:
+            item = self._get(in_queue)
+            if item is _END:
+                break
+            if item is _STOPPED:
+                self._raise_error()
+                raise RuntimeError("Pipeline stopped")
+            yield item
+        self._raise_error()
+
+    def put(self, out_queue, item):
+        """Hand an item to the next stage, blocking while its queue is full"""
+        if not self._put(out_queue, item):
+            self._raise_error()
+            raise RuntimeError("Pipeline stopped")
+
+    def finish(self, queues):
+        """Signal the end of input to ``queues`` and wait for all stages"""
+        for out_queue in queues:
+            self.put(out_queue, _END)
+        self.join()
+
+    def abort(self):
+        """Stop every stage without waiting for queued items"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        self._raise_error()
+
+    def _start(self, target, name):
+        def run():
+            try:
+                target()
+            except BaseException as e:
+                if self._error is None:
+                    self._error = e
+                self._stop.set()
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _put(self, out_queue, item):
+        while not self._stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, in_queue):
+        while not self._stop.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOPPED
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
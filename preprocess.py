@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+from simple_config_v2 import INFERENCE_SIZE
+
+
+def inference_shape(frame_shape, size):
+    """``(width, height)`` of a frame downscaled so its long side is at most ``size``"""
+    height, width = frame_shape[:2]
+    if not size or max(height, width) <= size:
+        return width, height
+    gain = size / max(height, width)
+    return max(1, int(round(width * gain))), max(1, int(round(height * gain)))
+
+
+def downscale_frames(frames, size=INFERENCE_SIZE):
+    """Frames resized (area interpolation) to at most ``size`` on the long side.
+
+    Frames already small enough are passed through untouched.
+    """
+    resized = []
+    for frame in frames:
+        width, height = inference_shape(frame.shape, size)
+        if (width, height) == (frame.shape[1], frame.shape[0]):
+            resized.append(frame)
+        else:
+            resized.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+    return resized
+
+
+def rescale_boxes(xyxy, from_shape, to_shape):
+    """Map xyxy boxes from a resized frame back to the original frame's pixels"""
+    if from_shape[:2] == to_shape[:2] or len(xyxy) == 0:
+        return xyxy
+    scale_x = to_shape[1] / from_shape[1]
+    scale_y = to_shape[0] / from_shape[0]
+    boxes = xyxy.astype(np.float64) * (scale_x, scale_y, scale_x, scale_y)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, to_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, to_shape[0])
+    return boxes.round().astype(np.int64)
+
+
+class ResizedBackend:
+    """Wraps an inference backend to run it on frames downscaled to ``size``.
+
+    Frames are resized once before they reach the model (instead of each
+    backend letterboxing full resolution frames itself) and the boxes are
+    mapped back, so callers keep working in original frame coordinates.
+    Other attributes are forwarded to the wrapped backend.
+    """
+
+    def __init__(self, backend, size=INFERENCE_SIZE):
+        self.backend = backend
+        self.size = size
+
+    def predict(self, frames):
+        resized = downscale_frames(frames, self.size)
+        outputs = self.backend.predict(resized)
+        return [(rescale_boxes(xyxy, small.shape, frame.shape), confidences)
+                for (xyxy, confidences), small, frame in zip(outputs, resized, frames)]
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
@@ -0,0 +1,108 @@
+import glob
+import logging
+import os
+
+import cv2
+
+from simple_config_v2 import CALIBRATION_DIR, CALIBRATION_IMAGES, ONNX_IMAGE_SIZE
+from inference_backend import letterbox, to_input_tensor
+
+try:
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+except ImportError:  # Only needed for INT8 precisions
+    onnx = None
+    CalibrationDataReader = object
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ('fp32', 'int8_dynamic', 'int8_static')
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+# Box decoding at the end of the YOLOv8 head needs float precision
+FLOAT_HEAD_OPS = {'Concat', 'Split', 'Reshape', 'Transpose', 'Softmax', 'Sigmoid', 'Mul', 'Add', 'Sub', 'Div', 'Slice'}
+
+
+def list_images(directory, limit=None):
+    paths = sorted(path for pattern in IMAGE_PATTERNS for path in glob.glob(os.path.join(directory, pattern)))
+    return paths[:limit] if limit else paths
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feeds sample frames, preprocessed like OnnxBackend, to the static calibrator"""
+
+    def __init__(self, input_name, image_paths, imgsz):
+        self.input_name = input_name
+        self.image_paths = iter(image_paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.image_paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                logger.warning(f"Skipping unreadable calibration image {path}")
+                continue
+            image, _, _ = letterbox(frame, self.imgsz)
+            return {self.input_name: to_input_tensor([image])}
+        return None
+
+
+def detect_head_nodes(model):
+    """Names of the box-decoding nodes of the last YOLO module (kept in float)"""
+    def module_index(name):
+        parts = name.split('/')
+        if len(parts) > 2 and parts[1].startswith('model.'):
+            suffix = parts[1][len('model.'):]
+            return int(suffix) if suffix.isdigit() else None
+        return None
+
+    indices = [module_index(node.name) for node in model.graph.node]
+    indices = [index for index in indices if index is not None]
+    if not indices:
+        return []
+    head = max(indices)
+    return [node.name for node in model.graph.node
+            if module_index(node.name) == head and (node.op_type in FLOAT_HEAD_OPS or 'dfl' in node.name)]
+
+
+def quantize_model(onnx_path, precision, calibration_dir=CALIBRATION_DIR, max_images=CALIBRATION_IMAGES,
+                   imgsz=ONNX_IMAGE_SIZE):
+    """INT8 copy of an FP32 ONNX model, created once and reused while newer than it.
+
+    ``int8_dynamic`` quantizes weights only, activations are quantized on the
+    fly; no calibration data needed. ``int8_static`` also quantizes the
+    activations (QDQ format, per-channel weights) using ranges measured on
+    up to ``max_images`` frames from ``calibration_dir``; it is the faster
+    mode for convolutional models like YOLO.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown model precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    if precision == 'fp32':
+        return onnx_path
+    if onnx is None:
+        raise ImportError("INT8 models need onnx and onnxruntime (pip install onnx onnxruntime)")
+
+    output_path = f"{os.path.splitext(onnx_path)[0]}.{precision}.onnx"
+    if os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(onnx_path):
+        return output_path
+
+    model = onnx.load(onnx_path)
+    excluded = detect_head_nodes(model)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    if precision == 'int8_dynamic':
+        logger.info(f"Quantizing {onnx_path} to dynamic INT8")
+        quantize_dynamic(onnx_path, tmp_path, weight_type=QuantType.QUInt8, nodes_to_exclude=excluded)
+    else:
+        image_paths = list_images(calibration_dir, max_images)
+        if not image_paths:
+            raise ValueError(f"Static INT8 quantization needs sample frames in {calibration_dir}")
+        logger.info(f"Calibrating static INT8 quantization of {onnx_path} on {len(image_paths)} frames")
+        reader = FrameCalibrationReader(model.graph.input[0].name, image_paths, imgsz)
+        quantize_static(onnx_path, tmp_path, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=excluded)
+    os.replace(tmp_path, output_path)
+    logger.info(f"Quantized model written to {output_path}")
+    return output_path
@@ -0,0 +1,97 @@
+"""Accuracy vs speed of INT8 quantized models against the FP32 model.
+
+Usage:
+    python quantization_report.py --images holdout_frames/
+    python quantization_report.py --images holdout_frames/ --precisions int8_static --threads 4
+
+Every precision runs on the same held-out images (keep them separate from
+CALIBRATION_DIR). The FP32 ONNX detections are the reference: recall is
+the share of FP32 boxes an INT8 model still finds (IoU >= --iou), precision
+the share of INT8 boxes the FP32 model agrees with.
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+from simple_config_v2 import MODEL_PATH, BATCH_SIZE, CALIBRATION_DIR
+from inference_backend import OnnxBackend
+from quantization import list_images
+from benchmark_backends import benchmark, box_iou
+
+
+def agreement(reference, candidate, iou_threshold):
+    """Recall, precision, mean matched IoU and mean confidence difference"""
+    reference_boxes = candidate_boxes = matched = 0
+    ious = []
+    conf_diffs = []
+    for (ref_xyxy, ref_conf), (cand_xyxy, cand_conf) in zip(reference, candidate):
+        reference_boxes += len(ref_xyxy)
+        candidate_boxes += len(cand_xyxy)
+        if len(ref_xyxy) == 0 or len(cand_xyxy) == 0:
+            continue
+        iou = box_iou(ref_xyxy, cand_xyxy)
+        # Greedy one-to-one matching, best pairs first
+        used_ref, used_cand = set(), set()
+        for flat in np.argsort(iou, axis=None)[::-1]:
+            r, c = np.unravel_index(flat, iou.shape)
+            if iou[r, c] < iou_threshold:
+                break
+            if r in used_ref or c in used_cand:
+                continue
+            used_ref.add(r)
+            used_cand.add(c)
+            ious.append(iou[r, c])
+            conf_diffs.append(abs(ref_conf[r] - cand_conf[c]))
+        matched += len(used_ref)
+    return {
+        'recall': matched / reference_boxes if reference_boxes else 1.0,
+        'precision': matched / candidate_boxes if candidate_boxes else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'conf_diff': float(np.mean(conf_diffs)) if conf_diffs else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--images', required=True, help='held-out image directory')
+    parser.add_argument('--max-images', type=int, default=200)
+    parser.add_argument('--precisions', nargs='+', default=['int8_dynamic', 'int8_static'])
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--threads', type=int, default=0, help='ONNX intra-op threads (0 = default)')
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU for a box to count as found')
+    args = parser.parse_args()
+
+    if os.path.abspath(args.images) == os.path.abspath(CALIBRATION_DIR):
+        print(f"Warning: {args.images} is also the calibration set, accuracy will look better than it is")
+
+    frames = [frame for frame in (cv2.imread(path) for path in list_images(args.images, args.max_images))
+              if frame is not None]
+    if not frames:
+        raise SystemExit(f"No readable images in {args.images}")
+    print(f"{len(frames)} held-out images, batch size {args.batch_size}\n")
+
+    rows = []
+    reference = None
+    reference_fps = None
+    for precision in ['fp32'] + [p for p in args.precisions if p != 'fp32']:
+        backend = OnnxBackend(args.model, intra_op_threads=args.threads, precision=precision)
+        outputs, fps = benchmark(backend, frames, args.batch_size)
+        size_mb = os.path.getsize(backend.onnx_path) / 1024 / 1024
+        if reference is None:
+            reference, reference_fps = outputs, fps
+        rows.append((precision, size_mb, fps, agreement(reference, outputs, args.iou)))
+
+    print(f"{'Precision':<14} {'Size MB':>8} {'FPS':>8} {'Speedup':>8} {'Recall':>7} {'Precision':>9} "
+          f"{'Mean IoU':>9} {'Conf diff':>9}")
+    print("-" * 81)
+    for precision, size_mb, fps, acc in rows:
+        speedup = fps / reference_fps if reference_fps else 0.0
+        print(f"{precision:<14} {size_mb:>8.1f} {fps:>8.2f} {speedup:>7.2f}x {acc['recall']:>7.3f} "
+              f"{acc['precision']:>9.3f} {acc['mean_iou']:>9.3f} {acc['conf_diff']:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
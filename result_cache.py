@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache is only shared between threads
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def save_and_hash(file_storage, path, chunk_size=CHUNK_SIZE):
+    """Save an uploaded file while computing its SHA-256 in the same pass"""
+    sha256 = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while True:
+            chunk = file_storage.stream.read(chunk_size)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            f.write(chunk)
+    return sha256.hexdigest()
+
+
+def config_fingerprint(model_path, settings):
+    """Hash of the model file identity and the settings that affect results"""
+    try:
+        stat = os.stat(model_path)
+        model_id = [os.path.abspath(model_path), stat.st_size, stat.st_mtime]
+    except OSError:
+        model_id = [model_path]
+    payload = json.dumps({'model': model_id, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@contextmanager
+def locked_json(path, lock_path, thread_lock, **defaults):
+    """Read-modify-write a JSON document shared by threads and processes.
+
+    Yields the parsed document (missing keys filled from ``defaults``) while
+    holding ``thread_lock`` and an advisory lock on ``lock_path``, then
+    atomically writes it back.
+    """
+    with thread_lock, open(lock_path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path) as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                document = {}
+            for key, value in defaults.items():
+                document.setdefault(key, value)
+            yield document
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(document, f)
+            os.replace(tmp_path, path)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class ResultCache:
+    """Cache of processed uploads.
+
+    Entries map ``sha256(upload) + config fingerprint`` to the result payload
+    of the job that produced them and the output files it wrote. The index is
+    a JSON file next to the outputs, guarded by an advisory file lock so all
+    gunicorn workers share it. The cache never deletes output files, that is
+    left to the retention manager; entries whose files are gone are dropped.
+
+    The index also records which job is currently producing each key, so
+    identical uploads arriving while it runs are coalesced onto that job.
+    """
+
+    def __init__(self, cache_dir, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock_path = os.path.join(cache_dir, 'index.lock')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_hash, fingerprint):
+        return hashlib.sha256(f"{content_hash}:{fingerprint}".encode()).hexdigest()
+
+    def get(self, key):
+        """Cached result payload for ``key``, or None (entries with missing files are dropped)"""
+        with self._index() as index:
+            entry = index['entries'].get(key)
+            if entry is None:
+                return None
+            if not self._files_exist(entry):
+                del index['entries'][key]
+                return None
+            entry['last_access'] = time.time()
+            return entry['result']
+
+    def put(self, key, result, files):
+        """Store a finished result, dropping entries whose files were removed since"""
+        size = 0
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+        with self._index() as index:
+            index['entries'][key] = {
+                'result': result,
+                'files': list(files),
+                'bytes': size,
+                'created': time.time(),
+                'last_access': time.time()
+            }
+            self._drop_missing(index)
+
+    def claim(self, key, job_id, is_active):
+        """Register ``job_id`` as producer of ``key`` unless an active job already is.
+
+        Returns the id of the job producing the result: ``job_id`` when the
+        claim succeeded, otherwise the id of the in-flight job to reuse.
+        ``is_active(job_id)`` tells whether a previously claimed job is still
+        queued or running.
+        """
+        with self._index() as index:
+            owner = index['inflight'].get(key)
+            if owner and owner != job_id and is_active(owner):
+                return owner
+            index['inflight'][key] = job_id
+            return job_id
+
+    def release(self, key, job_id):
+        """Drop the in-flight claim of ``job_id`` on ``key``"""
+        with self._index() as index:
+            if index['inflight'].get(key) == job_id:
+                del index['inflight'][key]
+
+    def _files_exist(self, entry):
+        return all(os.path.exists(os.path.join(self.output_dir, name)) for name in entry['files'])
+
+    def _drop_missing(self, index):
+        entries = index['entries']
+        for key in [key for key, entry in entries.items() if not self._files_exist(entry)]:
+            del entries[key]
+
+    def _index(self):
+        """Locked read-modify-write access to the index"""
+        return locked_json(self.index_path, self._lock_path, self._lock, entries={}, inflight={})
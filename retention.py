@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+
+from result_cache import locked_json
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionManager:
+    """Disk budget and garbage collection for the web output directory.
+
+    Outputs are registered per owner (a video job, an image or a batch) in a
+    JSON index shared by all gunicorn workers. A background sweeper deletes
+    owners not accessed for ``max_age`` seconds and then evicts the least
+    recently used ones until the directory fits in ``max_bytes``. All files
+    of an owner, including derived copies such as ``<name>.gz``, go together.
+
+    Files nobody registered (leftovers of crashed jobs, outputs from before
+    the index existed) are swept like owners of their own, using their
+    modification time; ``orphan_grace`` protects outputs still being written
+    by a running job. Subdirectories (job state, cache index) are never touched.
+    """
+
+    def __init__(self, output_dir, max_bytes, max_age=0, sweep_interval=300, orphan_grace=3600):
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.orphan_grace = orphan_grace
+        self.index_path = os.path.join(output_dir, 'retention.json')
+        self._lock_path = os.path.join(output_dir, 'retention.lock')
+        self._lock = threading.Lock()
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def register(self, owner, files):
+        """Record the output files produced for ``owner``"""
+        now = time.time()
+        with self._index() as index:
+            index['owners'][owner] = {'files': list(files), 'created': now, 'last_access': now}
+            for name in files:
+                index['files'][name] = owner
+
+    def touch(self, filename):
+        """Mark a file as used; recorded in memory and written by the next sweep"""
+        with self._accessed_lock:
+            self._accessed[filename] = time.time()
+
+    def start(self):
+        """Start the sweeper thread of this process (no-op when already running)"""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        # A thread started before fork() doesn't exist in the child, start a new one
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='retention-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {e}")
+
+    def sweep(self):
+        """Delete expired and least recently used outputs; returns the number of files removed"""
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+
+        now = time.time()
+        removed = 0
+        with self._index() as index:
+            owners = index['owners']
+            files = index['files']
+            for name, accessed_at in accessed.items():
+                owner = self._owner_of(files, name)
+                if owner in owners:
+                    owners[owner]['last_access'] = max(owners[owner]['last_access'], accessed_at)
+
+            # Group everything on disk by owner
+            groups = {}
+            for entry in os.scandir(self.output_dir):
+                if entry.is_dir(follow_symlinks=False):
+                    continue
+                if entry.name in ('retention.json', 'retention.lock') or entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                owner = self._owner_of(files, entry.name)
+                if owner in owners:
+                    key, last_access = owner, owners[owner]['last_access']
+                elif now - stat.st_mtime < self.orphan_grace:
+                    continue
+                else:
+                    key, last_access = None, stat.st_mtime
+                base = entry.name[:-3] if entry.name.endswith('.gz') else entry.name
+                group = groups.setdefault(key or f"file:{base}", {'owner': key, 'files': [], 'bytes': 0,
+                                                                   'last_access': last_access})
+                group['files'].append(entry.name)
+                group['bytes'] += stat.st_size
+
+            # Owners whose files are all gone (e.g. removed by hand)
+            for owner in [owner for owner in owners if owner not in groups]:
+                self._forget(index, owner)
+
+            total = sum(group['bytes'] for group in groups.values())
+            for key in sorted(groups, key=lambda k: groups[k]['last_access']):
+                group = groups[key]
+                expired = self.max_age and now - group['last_access'] > self.max_age
+                if not expired and total <= self.max_bytes:
+                    break
+                for name in group['files']:
+                    try:
+                        os.remove(os.path.join(self.output_dir, name))
+                        removed += 1
+                    except OSError:
+                        pass
+                total -= group['bytes']
+                if group['owner']:
+                    self._forget(index, group['owner'])
+
+        if removed:
+            logger.info(f"Retention sweep removed {removed} files, {total / 1024 / 1024:.1f} MB left")
+        return removed
+
+    @staticmethod
+    def _owner_of(files, name):
+        """Owner of a file or of the file a ``.gz`` copy was derived from"""
+        owner = files.get(name)
+        if owner is None and name.endswith('.gz'):
+            owner = files.get(name[:-3])
+        return owner
+
+    def _forget(self, index, owner):
+        for name in index['owners'].pop(owner)['files']:
+            if index['files'].get(name) == owner:
+                del index['files'][name]
+
+    def _index(self):
+        return locked_json(self.index_path, self._lock_path, self._lock, owners={}, files={})
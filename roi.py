@@ -0,0 +1,190 @@
+import logging
+
+import cv2
+import numpy as np
+
+from simple_config_v2 import (
+    ROI_MODE, ROI_BAND, ROI_POLYGON, ROI_AUTO_FRAMES, ROI_AUTO_MIN_DETECTIONS, ROI_AUTO_COVERAGE, ROI_AUTO_MARGIN
+)
+
+logger = logging.getLogger(__name__)
+
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+
+
+class FullFrame:
+    """No region of interest: frames go to the model whole.
+
+    Regions crop each frame before inference and map the boxes back, so
+    ``predict(predict_fn, frames)`` returns boxes in original frame
+    coordinates whatever the region. Rectangles are ``(x0, y0, x1, y1)``
+    fractions of the frame.
+    """
+
+    name = 'none'
+
+    def __init__(self):
+        self.rect = FULL_FRAME
+
+    def predict(self, predict, frames):
+        """Run ``predict`` on the cropped frames; one ``(xyxy, confidences)`` per frame"""
+        crops = [self.crop(frame) for frame in frames]
+        outputs = predict([image for image, _ in crops]) if frames else []
+        restored = [self.restore(boxes, offset, frame.shape)
+                    for boxes, (_, offset), frame in zip(outputs, crops, frames)]
+        for (xyxy, _), frame in zip(restored, frames):
+            self.observe(xyxy, frame.shape)
+        return restored
+
+    def crop(self, frame):
+        """``(view of the region, (x, y) offset of the view in the frame)``"""
+        if self.rect == FULL_FRAME:
+            return frame, (0, 0)
+        x0, y0, x1, y1 = self.pixel_rect(frame.shape)
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def restore(self, boxes, offset, frame_shape):
+        """Boxes found in a crop shifted back to frame coordinates"""
+        xyxy, confidences = boxes
+        if offset == (0, 0) or len(xyxy) == 0:
+            return xyxy, confidences
+        xyxy = xyxy + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=xyxy.dtype)
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame_shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame_shape[0])
+        return xyxy, confidences
+
+    def observe(self, xyxy, frame_shape):
+        pass
+
+    def pixel_rect(self, frame_shape):
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = self.rect
+        left, top = int(x0 * width), int(y0 * height)
+        right, bottom = max(left + 1, int(round(x1 * width))), max(top + 1, int(round(y1 * height)))
+        return left, top, right, bottom
+
+    @property
+    def area(self):
+        """Share of the frame's pixels sent to the model"""
+        x0, y0, x1, y1 = self.rect
+        return (x1 - x0) * (y1 - y0)
+
+    def summary(self):
+        return {'mode': self.name, 'rect': [round(value, 3) for value in self.rect], 'area': round(self.area, 3)}
+
+
+class BandRoi(FullFrame):
+    """Horizontal band of the frame, ``(top, bottom)`` as fractions of its height"""
+
+    name = 'band'
+
+    def __init__(self, band=ROI_BAND):
+        super().__init__()
+        top, bottom = band
+        self.rect = (0.0, max(0.0, top), 1.0, min(1.0, bottom))
+
+
+class PolygonRoi(FullFrame):
+    """Polygon of ``(x, y)`` frame fractions, e.g. the road ahead.
+
+    The model sees the polygon's bounding rectangle; boxes whose centre
+    falls outside the polygon are dropped.
+    """
+
+    name = 'polygon'
+
+    def __init__(self, polygon=ROI_POLYGON):
+        super().__init__()
+        self.polygon = np.array(polygon, dtype=np.float64).clip(0.0, 1.0)
+        x0, y0 = self.polygon.min(axis=0)
+        x1, y1 = self.polygon.max(axis=0)
+        self.rect = (x0, y0, x1, y1)
+        self._contours = {}
+
+    def restore(self, boxes, offset, frame_shape):
+        xyxy, confidences = super().restore(boxes, offset, frame_shape)
+        if len(xyxy) == 0:
+            return xyxy, confidences
+        contour = self._contour(frame_shape)
+        centres = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+        keep = np.array([cv2.pointPolygonTest(contour, (float(x), float(y)), False) >= 0 for x, y in centres])
+        return xyxy[keep], confidences[keep]
+
+    def _contour(self, frame_shape):
+        height, width = frame_shape[:2]
+        if (height, width) not in self._contours:
+            self._contours[(height, width)] = (self.polygon * (width, height)).astype(np.float32).reshape(-1, 1, 2)
+        return self._contours[(height, width)]
+
+
+class AutoRoi(FullFrame):
+    """Learns a tight crop from where the model finds potholes in a video.
+
+    The first ``learn_frames`` frames (and until ``min_detections`` boxes
+    were seen) run full frame while box coverage accumulates in a coarse
+    heatmap. The crop then locks to the rows and columns holding
+    ``coverage`` of that heat, padded by ``margin``, for the rest of the
+    video. Without enough detections frames keep running full frame.
+    """
+
+    name = 'auto'
+
+    def __init__(self, learn_frames=ROI_AUTO_FRAMES, min_detections=ROI_AUTO_MIN_DETECTIONS,
+                 coverage=ROI_AUTO_COVERAGE, margin=ROI_AUTO_MARGIN, grid=64):
+        super().__init__()
+        self.learn_frames = learn_frames
+        self.min_detections = max(1, min_detections)
+        self.coverage = coverage
+        self.margin = margin
+        self.grid = grid
+        self.heatmap = np.zeros((grid, grid), dtype=np.float64)
+        self.frames_seen = 0
+        self.detections_seen = 0
+        self.locked = False
+
+    def observe(self, xyxy, frame_shape):
+        if self.locked:
+            return
+        height, width = frame_shape[:2]
+        for x1, y1, x2, y2 in xyxy:
+            col0, col1 = int(x1 / width * self.grid), int(np.ceil(x2 / width * self.grid))
+            row0, row1 = int(y1 / height * self.grid), int(np.ceil(y2 / height * self.grid))
+            self.heatmap[row0:max(row1, row0 + 1), col0:max(col1, col0 + 1)] += 1
+        self.frames_seen += 1
+        self.detections_seen += len(xyxy)
+        if self.frames_seen >= self.learn_frames and self.detections_seen >= self.min_detections:
+            self.lock()
+
+    def lock(self):
+        """Fix the crop to the learned region"""
+        x0, x1 = self._span(self.heatmap.sum(axis=0))
+        y0, y1 = self._span(self.heatmap.sum(axis=1))
+        self.rect = (max(0.0, x0 - self.margin), max(0.0, y0 - self.margin),
+                     min(1.0, x1 + self.margin), min(1.0, y1 + self.margin))
+        self.locked = True
+        logger.info(f"Auto ROI locked after {self.frames_seen} frames and {self.detections_seen} detections: "
+                    f"{self.summary()}")
+
+    def _span(self, heat):
+        """Fractions bounding ``coverage`` of the heat, trimming both tails equally"""
+        cumulative = np.cumsum(heat)
+        tail = (1.0 - self.coverage) / 2 * cumulative[-1]
+        start = int(np.searchsorted(cumulative, tail, side='right'))
+        end = int(np.searchsorted(cumulative, cumulative[-1] - tail, side='left'))
+        return start / self.grid, (end + 1) / self.grid
+
+    def summary(self):
+        return dict(super().summary(), locked=self.locked)
+
+
+def create_roi(mode=ROI_MODE):
+    """Region of interest by name: 'none', 'band', 'polygon' or 'auto' (one per video)"""
+    if mode == 'none':
+        return FullFrame()
+    if mode == 'band':
+        return BandRoi()
+    if mode == 'polygon':
+        return PolygonRoi()
+    if mode == 'auto':
+        return AutoRoi()
+    raise ValueError(f"Unknown ROI mode: {mode}")
@@ -10,7 +10,10 @@ OUTPUT_CSV = 'output/pothole_measurements.csv'  # Output CSV path
 
 # Processing Configuration
 FRAME_SKIP = 3  # Process every nth frame (1 = process all frames)
+FRAME_SAMPLING = 'fixed'  # 'fixed' (every FRAME_SKIP-th frame) or 'motion' (settings in simple_config_v2.py)
+WRITE_ONLY_SAMPLED_FRAMES = True  # Output video holds only sampled frames (skipped frames are never decoded)
 SHOW_PREVIEW = False  # Show live preview (set to False for headless operation)
+ANNOTATE_OUTPUT = True  # Write an annotated video (False = CSV only, frames are never copied or drawn on)
 
 # Depth Estimation Configuration
 # These parameters can be adjusted based on your camera setup
@@ -51,4 +54,7 @@ SAVE_IMAGES = False  # Save individual frames with detections
 
 # Performance Configuration
 USE_GPU = True  # Use GPU if available
-BATCH_SIZE = 1  # Process frames in batches (1 for real-time) 
\ No newline at end of file
+BATCH_SIZE = 8  # Frames per model call (1 = frame-by-frame for real-time)
+INFERENCE_BACKEND = 'ultralytics'  # 'ultralytics' (torch) or 'onnx' (settings in simple_config_v2.py)
+INFERENCE_SIZE = 0  # Long side frames are downscaled to before inference (0 = backend default, 640)
+ROI_MODE = 'none'  # 'none', 'band', 'polygon' or 'auto' (settings in simple_config_v2.py)
@@ -3,6 +3,9 @@
 
 # Model Configuration
 MODEL_PATH = 'best.pt'  # Path to your YOLO model
+MODEL_PRECISION = 'fp32'  # 'fp32', 'int8_dynamic' or 'int8_static' (INT8 runs on the ONNX backend, CPU)
+CALIBRATION_DIR = 'calibration_frames'  # Sample frames for 'int8_static' calibration
+CALIBRATION_IMAGES = 200  # Maximum number of calibration frames used
 
 # Video Processing Configuration
 INPUT_VIDEO = 'p.mp4'  # Input video file path
@@ -11,7 +14,14 @@ OUTPUT_CSV = 'output/pothole_measurements.csv'  # Output CSV path
 
 # Processing Configuration - Optimized for accuracy
 FRAME_SKIP = 1  # Process every frame for maximum accuracy (was 3)
+FRAME_SAMPLING = 'fixed'  # 'fixed' (every FRAME_SKIP-th frame) or 'motion' (uniform road coverage)
+MOTION_TARGET = 0.15  # 'motion': sample once the road moved this fraction of the lower half of the view
+MOTION_MIN_SKIP = 1  # 'motion': fewest frames between samples (fast driving)
+MOTION_MAX_SKIP = 15  # 'motion': most frames between samples (stopped vehicle)
+MOTION_DOWNSCALE_WIDTH = 160  # 'motion': width of the grayscale copy motion is measured on
+WRITE_ONLY_SAMPLED_FRAMES = True  # Output video holds only sampled frames (skipped frames are never decoded)
 SHOW_PREVIEW = False  # Show live preview (set to False for headless operation)
+ANNOTATE_OUTPUT = True  # Write an annotated video (False = CSV only, frames are never copied or drawn on)
 
 # Enhanced Detection Configuration
 CONFIDENCE_THRESHOLD = 0.3  # Lower threshold to catch more potholes (was 0.5)
@@ -73,16 +83,46 @@ ASPECT_RATIO_RANGE = (0.5, 2.0)  # Acceptable aspect ratios for potholes
 
 # Performance Configuration
 USE_GPU = True  # Use GPU if available
-BATCH_SIZE = 1  # Process frames in batches (1 for real-time)
+BATCH_SIZE = 8  # Frames per model call (1 = frame-by-frame for real-time)
+PIPELINE_QUEUE_SIZE = 4  # CSV row batches buffered between the inference and CSV stages
+PIPELINE_QUEUE_FRAMES = 0  # Decoded frames buffered per pipeline queue and per batch (0 = BATCH_SIZE)
+SHARD_WORKERS = 1  # Processes one long video is split across in the CLI detector (0 = one per CPU core)
+SHARD_MIN_FRAMES = 3000  # Shorter videos are processed in a single process
 ENABLE_TRACKING = True  # Enable object tracking for consistency
 TRACKING_BUFFER = 5  # Number of frames to maintain tracking
 
+# Region of Interest Configuration
+ROI_MODE = 'none'  # 'none', 'band', 'polygon' or 'auto' (crop learned from each video's first detections)
+ROI_BAND = (0.4, 1.0)  # 'band': top and bottom of the road band, fractions of the frame height
+ROI_POLYGON = [(0.0, 1.0), (0.0, 0.65), (0.35, 0.4), (0.65, 0.4), (1.0, 0.65), (1.0, 1.0)]  # 'polygon': (x, y) frame fractions
+ROI_AUTO_FRAMES = 60  # 'auto': sampled frames run full frame while the detection heatmap is learned
+ROI_AUTO_MIN_DETECTIONS = 20  # 'auto': detections needed before the crop locks
+ROI_AUTO_COVERAGE = 0.98  # 'auto': share of the detection heatmap the crop keeps
+ROI_AUTO_MARGIN = 0.05  # 'auto': padding around the learned crop, fraction of the frame
+
+# Inference Backend Configuration
+INFERENCE_SIZE = 0  # Long side (px, multiple of 32) frames are downscaled to before inference (0 = backend default, 640)
+INFERENCE_BACKEND = 'ultralytics'  # 'ultralytics' (torch) or 'onnx' (onnxruntime, CPU)
+ONNX_MODEL_PATH = ''  # Exported model path ('' = next to MODEL_PATH, exported on first use)
+ONNX_IMAGE_SIZE = 640  # Inference size the ONNX model is exported and letterboxed for
+ONNX_INTRA_OP_THREADS = 0  # Threads inside one ONNX operator (0 = onnxruntime default)
+ONNX_INTER_OP_THREADS = 1  # Threads running independent operators in parallel (0 = default)
+
 # Output Configuration
 SAVE_VIDEO = True  # Save processed video
 SAVE_CSV = True    # Save measurements to CSV
 SAVE_IMAGES = False  # Save individual frames with detections
 SAVE_DETAILED_STATS = True  # Save detailed statistics
 
+# Video Encoding Configuration
+VIDEO_ENCODER = 'ffmpeg'  # 'ffmpeg' (pipe writer) or 'opencv' (mp4v fallback)
+FFMPEG_BINARY = 'ffmpeg'  # ffmpeg executable used by the pipe writer
+VIDEO_CODEC = 'libx264'  # Codec for the web MP4 (libx264, libx265, libvpx-vp9)
+VIDEO_CRF = 23  # Constant rate factor (lower = better quality, bigger files)
+VIDEO_PRESET = 'veryfast'  # Encoder speed/compression trade-off
+VIDEO_OUTPUT_SCALE = 1.0  # Scale factor applied to the encoded output video
+SAVE_AVI = False  # Also write an XVID AVI next to the web MP4
+
 # Quality Assurance
 ENABLE_FILTERING = True  # Enable detection filtering
 MIN_DETECTION_CONFIDENCE = 0.25  # Minimum confidence for final detection
@@ -91,4 +131,42 @@ TEMPORAL_FILTERING = True  # Filter detections based on temporal consistency
 
 # Logging Configuration
 LOG_LEVEL = 'INFO'  # Logging level (DEBUG, INFO, WARNING, ERROR)
-SAVE_DETECTION_LOGS = True  # Save detailed detection logs 
\ No newline at end of file
+SAVE_DETECTION_LOGS = True  # Save detailed detection logs 
+
+# Web Job Queue Configuration
+JOB_WORKERS = 2  # Number of videos processed concurrently in the background
+MAX_PENDING_JOBS = 16  # Maximum queued + running jobs before uploads are rejected
+JOB_RESULT_TTL = 3600  # Seconds finished job results are kept for polling
+JOB_STALL_TIMEOUT = 60  # Seconds without progress before a running job is reported as stalled
+PROGRESS_INTERVAL = 1.0  # Seconds between progress events of a video job
+SSE_KEEPALIVE_INTERVAL = 15  # Seconds between keepalive comments on idle event streams
+
+# Web Upload Configuration
+MAX_UPLOAD_MB = 16  # Maximum size of a single /upload request
+MAX_BATCH_UPLOAD_MB = 512  # Maximum size of a /upload/batch request (images or ZIP archives)
+MAX_BATCH_IMAGES = 500  # Maximum number of images in one batch upload
+IMAGE_DECODE_WORKERS = 4  # Threads decoding and encoding batch images
+JPEG_QUALITY = 90  # Quality of annotated JPEGs returned for image uploads (1-100)
+MAX_IMAGE_DIMENSION = 0  # Downscale annotated images so the longer side fits (0 = keep size)
+DETECTIONS_HEADER_MAX_BYTES = 4096  # Larger detection lists are left out of X-Detections (proxies cap headers at 4-8KB)
+
+# Download Configuration
+DOWNLOAD_MAX_AGE = 31536000  # Cache-Control max-age (seconds) of processed outputs, which never change
+GZIP_CSV = True  # Serve CSV downloads gzip-compressed to clients that accept it
+
+# Output Retention Configuration
+RETENTION_MAX_MB = 10240  # Disk budget of web_output/, least recently used outputs removed first
+RETENTION_MAX_AGE_HOURS = 72  # Remove outputs not accessed for this long (0 = keep until over budget)
+RETENTION_SWEEP_INTERVAL = 300  # Seconds between retention sweeps
+RETENTION_ORPHAN_GRACE = 3600  # Seconds unregistered files are left alone (outputs still being written)
+
+# Result Cache Configuration
+ENABLE_RESULT_CACHE = True  # Reuse results of identical uploads (same file, model and settings)
+
+# Deployment Configuration (gunicorn.conf.py)
+WEB_WORKERS = 2  # Gunicorn worker processes (overridden by WEB_CONCURRENCY)
+WEB_THREADS = 4  # Threads per worker sharing its model (requests, progress streams)
+PRELOAD_MODEL = True  # Load the model once in the master and share it with forked workers
+TORCH_THREADS_PER_WORKER = 0  # Torch intra-op threads per worker (0 = CPU cores / workers)
+METRICS_DIR = 'web_output/metrics'  # Workers publish metric snapshots here, /metrics sums those of live workers
+METRICS_PUBLISH_INTERVAL = 5  # Seconds between metric snapshots of each worker
@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
 import torch
-from ultralytics import YOLO
 import logging
 from datetime import datetime
 import os
@@ -10,6 +9,12 @@ import glob
 
 # Import configuration
 from simple_config import *
+from video_io import next_run_number, read_frame_batches
+from frame_sampler import create_sampler
+from inference_backend import create_backend
+from roi import create_roi
+from overlay import FONT, CachedOverlay, draw_label_lines, text_offset
+from detection_postprocess import DepthCategoryTable, box_sizes, build_detections
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -64,9 +69,10 @@ class SimplePotholeDetectorV2:
         self.device = 'cuda' if torch.cuda.is_available() and USE_GPU else 'cpu'
         logger.info(f"Using device: {self.device}")
         
-        # Load YOLO model
-        self.model = YOLO(model_path)
-        logger.info("YOLO model loaded successfully")
+        # Load YOLO model (ultralytics' default NMS IoU)
+        self.backend = create_backend(INFERENCE_BACKEND, model_path, conf=CONFIDENCE_THRESHOLD, iou=None,
+                                      inference_size=INFERENCE_SIZE)
+        logger.info(f"YOLO model loaded successfully ({self.backend.name} backend)")
         
         # Depth estimation parameters
         self.focal_length = FOCAL_LENGTH
@@ -74,10 +80,17 @@ class SimplePotholeDetectorV2:
         
         # Color mapping for different depth ranges
         self.depth_colors = {category: config['color'] for category, config in DEPTH_CATEGORIES.items()}
+        self.category_table = DepthCategoryTable(DEPTH_CATEGORIES, by_priority=False)
         
         # Statistics
         self.total_detections = 0
         self.detection_stats = {category: 0 for category in DEPTH_CATEGORIES.keys()}
+        
+        # Legend and device label are rendered once and pasted onto each frame
+        self.legend = CachedOverlay(260, len(DEPTH_CATEGORIES) * 25, self._draw_legend)
+        self.legend_labels = [f"{category.capitalize()}: " for category in DEPTH_CATEGORIES]
+        self.legend_count_x = [35 + text_offset(label) for label in self.legend_labels]
+        self.device_label = CachedOverlay(200, 25, self._draw_device_label)
     
     def estimate_depth_improved(self, bbox_width, bbox_height, frame_width, frame_height):
         """Improved depth estimation using multiple factors"""
@@ -85,97 +98,76 @@ class SimplePotholeDetectorV2:
         frame_area = frame_width * frame_height
         normalized_area = area / frame_area
         # Area-based: 0.22 - (normalized_area * 0.5)
-        depth_area = max(0.02, 0.22 - (normalized_area * 0.5))
+        # Works on scalars and on NumPy arrays of boxes alike
+        depth_area = np.maximum(0.02, 0.22 - (normalized_area * 0.5))
         return depth_area
     
     def get_depth_category(self, depth):
         """Categorize depth and return color"""
-        for category, config in DEPTH_CATEGORIES.items():
-            if depth <= config['max_depth']:
-                return category, self.depth_colors[category]
-        
-        # Fallback to critical
-        return 'critical', self.depth_colors['critical']
+        return self.category_table.category(depth)
     
     def detect_potholes(self, frame):
         """Detect potholes in a frame and return annotated frame with measurements"""
-        # Run YOLO detection with confidence threshold
-        results = self.model(frame, verbose=False, conf=CONFIDENCE_THRESHOLD, show=False)
+        return self.process_result(frame, self.infer_batch([frame])[0])
+    
+    def infer_batch(self, frames, roi=None):
+        """Run YOLO detection on a batch of frames, one ``(xyxy, confidences)`` per frame.
+
+        Only the ``roi`` of each frame (default: a fresh ROI_MODE region) goes to the model.
+        """
+        roi = roi or create_roi(ROI_MODE)
+        return roi.predict(self.backend.predict, frames)
+    
+    def process_result(self, frame, boxes, annotate=True):
+        """Turn one frame's YOLO boxes into an annotated frame (None unless ``annotate``) with measurements"""
+        frame_height, frame_width = frame.shape[:2]
         
-        annotated_frame = frame.copy()
-        detections = []
+        # All bounding boxes and confidence scores at once
+        xyxy, confidences = boxes
+        widths, heights = box_sizes(xyxy)
         
-        frame_height, frame_width = frame.shape[:2]
+        # Estimate depth and categorize every box in one go
+        depths = self.estimate_depth_improved(widths, heights, frame_width, frame_height)
+        detections = build_detections(xyxy, confidences, depths, self.category_table.lookup(depths), self.category_table)
         
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    # Get bounding box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    
-                    # Get confidence score
-                    confidence = float(box.conf[0].cpu().numpy())
-                    
-                    # Calculate dimensions
-                    width = x2 - x1
-                    height = y2 - y1
-                    
-                    # Estimate depth
-                    depth = self.estimate_depth_improved(width, height, frame_width, frame_height)
-                    
-                    # Debug: Log depth values occasionally
-                    if self.total_detections % 50 == 0:
-                        logger.info(f"Sample depth: {depth*100:.1f}cm for bbox {width}x{height}")
-                    
-                    # Get depth category and color
-                    depth_category, color = self.get_depth_category(depth)
-                    
-                    # Update statistics
-                    self.detection_stats[depth_category] += 1
-                    self.total_detections += 1
-                    
-                    # Draw bounding box
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                    
-                    # Add text with measurements
-                    text_lines = [
-                        f"Depth: {depth*100:.1f}cm",
-                        f"Width: {width}px",
-                        f"Height: {height}px",
-                        f"Category: {depth_category}",
-                        f"Conf: {confidence:.2f}"
-                    ]
-                    
-                    # Calculate text position
-                    text_x = x1
-                    text_y = y1 - 10
-                    
-                    # Draw text background
-                    for i, line in enumerate(text_lines):
-                        text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-                        cv2.rectangle(annotated_frame, 
-                                    (text_x, text_y - text_size[1] - 5),
-                                    (text_x + text_size[0], text_y + 5),
-                                    (0, 0, 0), -1)
-                        cv2.putText(annotated_frame, line, 
-                                  (text_x, text_y - i * 15),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                    
-                    # Store detection info
-                    detections.append({
-                        'bbox': (x1, y1, x2, y2),
-                        'width': width,
-                        'height': height,
-                        'depth': depth,
-                        'category': depth_category,
-                        'color': color,
-                        'confidence': confidence
-                    })
+        for detection in detections:
+            # Debug: Log depth values occasionally
+            if self.total_detections % 50 == 0:
+                logger.info(f"Sample depth: {detection['depth']*100:.1f}cm for bbox {detection['width']}x{detection['height']}")
+            
+            # Update statistics
+            self.detection_stats[detection['category']] += 1
+            self.total_detections += 1
         
+        annotated_frame = self.draw_detections(frame, detections) if annotate else None
         return annotated_frame, detections
     
+    def draw_detections(self, frame, detections):
+        """Copy of the frame with boxes and measurements drawn for each detection"""
+        annotated_frame = frame.copy()
+        for detection in detections:
+            x1, y1, x2, y2 = detection['bbox']
+            depth = detection['depth']
+            depth_category = detection['category']
+            color = detection['color']
+            
+            # Draw bounding box
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            
+            # Add text with measurements
+            text_lines = [
+                f"Depth: {depth*100:.1f}cm",
+                f"Width: {detection['width']}px",
+                f"Height: {detection['height']}px",
+                f"Category: {depth_category}",
+                f"Conf: {detection['confidence']:.2f}"
+            ]
+            
+            # Draw text on black backgrounds above the box
+            draw_label_lines(annotated_frame, text_lines, x1, y1 - 10)
+        
+        return annotated_frame
+    
     def add_overlay_info(self, frame, frame_count, total_frames, detections):
         """Add overlay information to the frame"""
         height, width = frame.shape[:2]
@@ -188,17 +180,23 @@ class SimplePotholeDetectorV2:
         cv2.putText(frame, f"Total: {self.total_detections}", 
                    (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
-        # Add legend
+        # Add legend (swatches and labels are cached, only the counts are drawn per frame)
         legend_y = height - 200
-        for i, (category, config) in enumerate(DEPTH_CATEGORIES.items()):
-            color = self.depth_colors[category]
-            cv2.rectangle(frame, (10, legend_y + i * 25), (30, legend_y + i * 25 + 20), color, -1)
-            cv2.putText(frame, f"{category.capitalize()}: {self.detection_stats[category]}", 
-                       (35, legend_y + i * 25 + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        self.legend.paste(frame, 10, legend_y)
+        for i, count in enumerate(self.detection_stats.values()):
+            cv2.putText(frame, str(count), (self.legend_count_x[i], legend_y + i * 25 + 15),
+                       FONT, 0.5, (255, 255, 255), 1)
         
         # Add processing info
-        cv2.putText(frame, f"Device: {self.device.upper()}", 
-                   (width - 200, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        self.device_label.paste(frame, width - 200, 15)
+    
+    def _draw_legend(self, canvas, key):
+        for i, (category, label) in enumerate(zip(DEPTH_CATEGORIES, self.legend_labels)):
+            cv2.rectangle(canvas, (0, i * 25), (20, i * 25 + 20), self.depth_colors[category], -1)
+            cv2.putText(canvas, label, (25, i * 25 + 15), FONT, 0.5, (255, 255, 255), 1)
+    
+    def _draw_device_label(self, canvas, key):
+        cv2.putText(canvas, f"Device: {self.device.upper()}", (0, 15), FONT, 0.5, (255, 255, 255), 1)
     
     def process_video(self, input_path=INPUT_VIDEO, show_preview=SHOW_PREVIEW):
         """Process a video file and detect potholes"""
@@ -217,45 +215,24 @@ class SimplePotholeDetectorV2:
         logger.info(f"Processing video: {input_path}")
         logger.info(f"Video properties: {width}x{height}, {fps} FPS, {total_frames} frames")
 
-        # Find next available video number
+        # Find next available run number (videos and CSVs of earlier runs)
         output_dir = 'output'
-        
-        # Check for both numbered files and default files
-        numbered_pattern = os.path.join(output_dir, 'pothole_detection_*.avi')
-        default_video_path = os.path.join(output_dir, 'pothole_detection_output.avi')
-        
-        existing_files = glob.glob(numbered_pattern)
-        
-        # If default files exist, count them as well
-        if os.path.exists(default_video_path):
-            existing_files.append(default_video_path)
-        
-        if not existing_files:
-            video_number = 1
-        else:
-            numbers = []
-            for f in existing_files:
-                base = os.path.basename(f)
-                # Handle both numbered and default filenames
-                if base == 'pothole_detection_output.avi':
-                    numbers.append(0)  # Count default as number 0
-                else:
-                    num = base.replace('pothole_detection_', '').replace('.avi', '')
-                    if num.isdigit():
-                        numbers.append(int(num))
-            video_number = max(numbers) + 1 if numbers else 1
-        
+        video_number = next_run_number(output_dir, ['pothole_detection', 'pothole_measurements'])
         output_video_path = os.path.join(output_dir, f'pothole_detection_{video_number}.avi')
         output_csv_path = os.path.join(output_dir, f'pothole_measurements_{video_number}.csv')
         
         logger.info(f"Video number: {video_number}")
-        logger.info(f"Output video will be saved as: {output_video_path}")
+        if ANNOTATE_OUTPUT:
+            logger.info(f"Output video will be saved as: {output_video_path}")
         logger.info(f"Output CSV will be saved as: {output_csv_path}")
 
-        # Create output video writer with slower playback (half speed)
-        output_fps = max(1, fps // 2)  # Avoid zero FPS
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(output_video_path, fourcc, output_fps, (width, height))
+        # Create output video writer with slower playback (half speed), none in CSV only mode
+        # Half rate when only sampled frames are written; avoid zero FPS
+        out = None
+        if ANNOTATE_OUTPUT:
+            output_fps = max(1, fps // 2) if WRITE_ONLY_SAMPLED_FRAMES else max(1, fps)
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            out = cv2.VideoWriter(output_video_path, fourcc, output_fps, (width, height))
 
         # Setup CSV output for measurements
         csv_file = None
@@ -265,61 +242,71 @@ class SimplePotholeDetectorV2:
             csv_writer.writerow(['Frame', 'Timestamp', 'Width_px', 'Height_px', 'Depth_cm', 
                                'Category', 'Confidence', 'X1', 'Y1', 'X2', 'Y2'])
         
-        frame_count = 0
         processed_frames = 0
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Process every nth frame for efficiency
-            if frame_count % FRAME_SKIP != 0:
-                continue
-            
-            processed_frames += 1
-            
-            # Detect potholes
-            annotated_frame, detections = self.detect_potholes(frame)
-            
-            # Write detections to CSV
-            if csv_file:
-                timestamp = frame_count / fps
-                for detection in detections:
-                    x1, y1, x2, y2 = detection['bbox']
-                    csv_writer.writerow([
-                        frame_count, f"{timestamp:.2f}", detection['width'], detection['height'],
-                        f"{detection['depth']*100:.1f}", detection['category'], 
-                        f"{detection['confidence']:.3f}", x1, y1, x2, y2
-                    ])
-            
-            # Add overlay information
-            self.add_overlay_info(annotated_frame, frame_count, total_frames, detections)
-            
-            # Write frame to output video
-            out.write(annotated_frame)
+        # Process sampled frames only (every nth, or by motion), BATCH_SIZE frames per model call
+        sampler = create_sampler(FRAME_SAMPLING, FRAME_SKIP)
+        roi = create_roi(ROI_MODE)
+        detections = []
+        keep_skipped = ANNOTATE_OUTPUT and not WRITE_ONLY_SAMPLED_FRAMES
+        for batch in read_frame_batches(cap, BATCH_SIZE, sampler=sampler, keep_skipped=keep_skipped):
+            sampled_frames = [frame for _, frame, sampled in batch if sampled]
+            batch_boxes = iter(self.infer_batch(sampled_frames, roi) if sampled_frames else [])
             
-            # Show preview
-            # (Removed cv2.imshow and cv2.waitKey for headless operation)
-            # Progress update
-            if processed_frames % 30 == 0:
-                progress = (frame_count / total_frames) * 100
-                logger.info(f"Progress: {progress:.1f}% - Detections: {self.total_detections}")
+            for frame_count, frame, sampled in batch:
+                if not sampled:
+                    # Skipped frames are only written, with the last sampled frame's detections
+                    annotated_frame = self.draw_detections(frame, detections)
+                    self.add_overlay_info(annotated_frame, frame_count, total_frames, detections)
+                    out.write(annotated_frame)
+                    continue
+                
+                processed_frames += 1
+                
+                # Detect potholes
+                annotated_frame, detections = self.process_result(frame, next(batch_boxes), annotate=ANNOTATE_OUTPUT)
+                
+                # Write detections to CSV
+                if csv_file:
+                    timestamp = frame_count / fps
+                    for detection in detections:
+                        x1, y1, x2, y2 = detection['bbox']
+                        csv_writer.writerow([
+                            frame_count, f"{timestamp:.2f}", detection['width'], detection['height'],
+                            f"{detection['depth']*100:.1f}", detection['category'], 
+                            f"{detection['confidence']:.3f}", x1, y1, x2, y2
+                        ])
+                
+                # Add overlay information and write frame to output video
+                if out is not None:
+                    self.add_overlay_info(annotated_frame, frame_count, total_frames, detections)
+                    out.write(annotated_frame)
+                
+                # Show preview
+                # (Removed cv2.imshow and cv2.waitKey for headless operation)
+                # Progress update
+                if processed_frames % 30 == 0:
+                    progress = (frame_count / total_frames) * 100
+                    logger.info(f"Progress: {progress:.1f}% - Detections: {self.total_detections}")
         
         # Cleanup
         cap.release()
-        out.release()
+        if out is not None:
+            out.release()
         if csv_file:
             csv_file.close()
         # (Removed cv2.destroyAllWindows for headless operation)
         
         # Print final statistics
         self.print_statistics()
+        logger.info(f"Frame sampling ({FRAME_SAMPLING}): {sampler.sampled}/{sampler.seen} frames, "
+                    f"effective skip {sampler.effective_skip:.2f}")
+        if ROI_MODE != 'none':
+            logger.info(f"ROI: {roi.summary()}")
         
         logger.info(f"Measurements saved to: {output_csv_path}")
-        logger.info(f"Output video saved to: {output_video_path}")
+        if out is not None:
+            logger.info(f"Output video saved to: {output_video_path}")
     
     def print_statistics(self):
         """Print detection statistics"""
@@ -2,6 +2,8 @@ import requests
 import os
 import time
 
+JOB_TIMEOUT = 30 * 60  # Seconds to wait for a queued video before giving up
+
 def test_web_app():
     """Test the web application with sample files"""
     
@@ -59,6 +61,26 @@ def test_web_app():
                 print("   Uploading file...")
                 response = requests.post(f"{base_url}/upload", files=files, timeout=60)
                 
+                if response.status_code == 202:
+                    # Videos are queued, poll the job until it finishes
+                    job = response.json()
+                    print(f"   Queued as job {job['job_id']}, waiting...")
+                    deadline = time.time() + JOB_TIMEOUT
+                    timed_out = False
+                    while True:
+                        time.sleep(2)
+                        response = requests.get(f"{base_url}{job['status_url']}", timeout=10)
+                        status = response.json()
+                        if status.get('status') in ('done', 'failed', 'cancelled'):
+                            break
+                        if time.time() > deadline:
+                            stalled = " (stalled)" if status.get('stalled') else ""
+                            print(f"   ❌ Job still {status.get('status')}{stalled} after {JOB_TIMEOUT}s, giving up")
+                            timed_out = True
+                            break
+                    if timed_out:
+                        continue
+                
                 if response.status_code == 200:
                     data = response.json()
                     if data.get('success'):
@@ -0,0 +1,242 @@
+import cv2
+import numpy as np
+import glob
+import logging
+import os
+import shutil
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+
+def even_frame_size(width, height, scale=1.0):
+    """Scaled frame size rounded down to even dimensions (required by yuv420p)"""
+    out_width = max(2, int(width * scale) // 2 * 2)
+    out_height = max(2, int(height * scale) // 2 * 2)
+    return out_width, out_height
+
+
+class FFmpegVideoWriter:
+    """Encode BGR frames by piping raw video into an ffmpeg process"""
+
+    def __init__(self, path, fps, frame_size, codec='libx264', crf=23, preset='veryfast',
+                 scale=1.0, ffmpeg_binary='ffmpeg'):
+        self.path = path
+        self.frame_size = frame_size
+        width, height = frame_size
+        out_width, out_height = even_frame_size(width, height, scale)
+
+        cmd = [
+            ffmpeg_binary, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-', '-an',
+            '-vf', f'scale={out_width}:{out_height}',
+            '-c:v', codec
+        ]
+        if codec in ('libx264', 'libx265'):
+            cmd += ['-preset', preset, '-crf', str(crf)]
+        elif codec == 'libvpx-vp9':
+            cmd += ['-crf', str(crf), '-b:v', '0']
+        # yuv420p + faststart keep the file playable (and seekable) in browsers
+        cmd += ['-pix_fmt', 'yuv420p', '-movflags', '+faststart', path]
+
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited while writing {self.path}: {self._stderr()}")
+
+    def release(self):
+        if self._proc.stdin and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self._proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.path}: {self._stderr()}")
+
+    def _stderr(self):
+        return self._proc.stderr.read().decode(errors='replace').strip() if self._proc.stderr else ''
+
+
+class OpenCVVideoWriter:
+    """cv2.VideoWriter with the same interface (and optional output scale)"""
+
+    def __init__(self, path, fps, frame_size, fourcc='mp4v', scale=1.0):
+        self.path = path
+        self.out_size = even_frame_size(*frame_size, scale) if scale != 1.0 else tuple(frame_size)
+        self._resize = self.out_size != tuple(frame_size)
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, self.out_size)
+        if not self._writer.isOpened():
+            raise RuntimeError(f"Could not open video writer for {path}")
+
+    def write(self, frame):
+        if self._resize:
+            frame = cv2.resize(frame, self.out_size, interpolation=cv2.INTER_AREA)
+        self._writer.write(frame)
+
+    def release(self):
+        self._writer.release()
+
+
+class MultiVideoWriter:
+    """Fan the same frames out to several writers in a single pass"""
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, frame):
+        for writer in self.writers:
+            writer.write(frame)
+
+    def release(self):
+        errors = []
+        for writer in self.writers:
+            try:
+                writer.release()
+            except Exception as e:
+                errors.append(str(e))
+        if errors:
+            raise RuntimeError('; '.join(errors))
+
+
+def open_web_video_writer(path, fps, frame_size, encoder='ffmpeg', codec='libx264', crf=23,
+                          preset='veryfast', scale=1.0, ffmpeg_binary='ffmpeg'):
+    """Open a writer producing a browser playable MP4.
+
+    Uses an ffmpeg pipe when available, otherwise falls back to OpenCV's
+    ``mp4v`` encoder.
+    """
+    if encoder == 'ffmpeg':
+        if shutil.which(ffmpeg_binary):
+            return FFmpegVideoWriter(path, fps, frame_size, codec=codec, crf=crf, preset=preset,
+                                     scale=scale, ffmpeg_binary=ffmpeg_binary)
+        logger.warning(f"{ffmpeg_binary} not found, falling back to OpenCV mp4v encoding")
+    return OpenCVVideoWriter(path, fps, frame_size, fourcc='mp4v', scale=scale)
+
+
+def concat_videos(paths, output_path, fourcc='XVID', ffmpeg_binary='ffmpeg'):
+    """Join video segments with identical encoding settings into one file.
+
+    Uses ffmpeg's concat demuxer (stream copy, no re-encoding) when
+    available, otherwise re-encodes every frame through OpenCV.
+    """
+    if shutil.which(ffmpeg_binary):
+        list_path = f"{output_path}.segments.txt"
+        with open(list_path, 'w') as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        try:
+            result = subprocess.run([ffmpeg_binary, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                                     '-i', list_path, '-c', 'copy', output_path], stderr=subprocess.PIPE)
+        finally:
+            os.remove(list_path)
+        if result.returncode == 0:
+            return output_path
+        logger.warning(f"ffmpeg concat failed ({result.stderr.decode(errors='replace').strip()}), "
+                       f"re-encoding with OpenCV")
+
+    writer = None
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if writer is None:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 1
+                writer = OpenCVVideoWriter(output_path, fps, (frame.shape[1], frame.shape[0]), fourcc=fourcc)
+            writer.write(frame)
+        cap.release()
+    if writer is not None:
+        writer.release()
+    return output_path
+
+
+def next_run_number(output_dir, stems):
+    """Next free number for run outputs named ``<stem>_<n>.<ext>`` (``<stem>_output.<ext>`` counts as 0).
+
+    Every stem of the run's outputs (video and CSV) is considered, so runs
+    that write only some of them (e.g. CSV only) still get a new number.
+    """
+    numbers = [0]
+    found = False
+    for stem in stems:
+        for path in glob.glob(os.path.join(output_dir, f'{stem}_*.*')):
+            number = os.path.splitext(os.path.basename(path))[0][len(stem) + 1:]
+            if number == 'output':
+                found = True
+            elif number.isdigit():
+                found = True
+                numbers.append(int(number))
+    return max(numbers) + 1 if found else 1
+
+
+def read_frames(cap, frame_skip=1, sampler=None, keep_skipped=False, start_frame=0, end_frame=None):
+    """Yield ``(frame_number, frame, sampled)`` for the frames of a capture.
+
+    Frames are only demuxed with ``cap.grab()`` and decoded with
+    ``cap.retrieve()`` when they will be used: when sampled, when
+    ``keep_skipped`` asks for every frame, or when the sampler needs the
+    pixels to decide. Skipped frames are not yielded unless ``keep_skipped``.
+
+    With a ``sampler`` (see frame_sampler.py) its ``accept(frame_number, frame)``
+    decides instead of ``frame_skip``. Frame numbers are 1-based like the
+    detection loops' ``frame_count``. ``start_frame``/``end_frame`` limit
+    reading to frames ``start_frame + 1`` .. ``end_frame`` of the video
+    (seeking first), keeping the video's own frame numbers.
+    """
+    needs_frame = sampler is not None and sampler.needs_frame
+    frame_count = start_frame
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if position != start_frame:
+            logger.warning(f"Seeked to frame {position} instead of {start_frame}, frame numbers may be off")
+    while (end_frame is None or frame_count < end_frame) and cap.grab():
+        frame_count += 1
+        frame = None
+        if needs_frame:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+        if sampler is not None:
+            sampled = sampler.accept(frame_count, frame)
+        else:
+            sampled = frame_count % frame_skip == 0
+        if not (sampled or keep_skipped):
+            continue
+        if frame is None:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+        yield frame_count, frame, sampled
+
+
+def read_frame_batches(cap, batch_size, frame_skip=1, sampler=None, keep_skipped=False, start_frame=0, end_frame=None,
+                       max_frames=None):
+    """Yield lists of ``(frame_number, frame, sampled)`` holding ``batch_size`` sampled frames.
+
+    See :func:`read_frames`; with ``keep_skipped`` the skipped frames in
+    between are included (``sampled`` False) so every frame can be written.
+    ``max_frames`` ends a batch early once it holds that many frames in
+    total, bounding the memory of batches padded with skipped frames. The
+    last batch may hold fewer sampled frames.
+    """
+    batch_size = max(1, batch_size)
+    batch = []
+    sampled_in_batch = 0
+    for item in read_frames(cap, frame_skip, sampler, keep_skipped, start_frame, end_frame):
+        batch.append(item)
+        if item[2]:
+            sampled_in_batch += 1
+        if sampled_in_batch == batch_size or (max_frames and len(batch) >= max_frames):
+            yield batch
+            batch = []
+            sampled_in_batch = 0
+    if batch:
+        yield batch
@@ -0,0 +1,91 @@
+"""Split one long video into frame ranges processed by separate processes.
+
+Each worker process loads its own copy of the model (limited to its share
+of the CPU threads), seeks to its range and writes a video segment and a
+CSV part; the parent stitches them back together in frame order.
+"""
+import csv
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from simple_config_v2 import ANNOTATE_OUTPUT, FFMPEG_BINARY
+from video_io import concat_videos
+
+logger = logging.getLogger(__name__)
+
+_detector = None
+
+
+def shard_ranges(total_frames, shards):
+    """``(start_frame, end_frame)`` ranges splitting ``total_frames`` into ``shards`` near-equal parts"""
+    shards = max(1, min(shards, total_frames))
+    bounds = [total_frames * i // shards for i in range(shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _init_worker(model_path, backend, threads):
+    global _detector
+    # Imported here: enhanced_pothole_detector imports this module
+    from enhanced_pothole_detector import EnhancedPotholeDetector
+    _detector = EnhancedPotholeDetector(model_path, backend, threads=threads)
+
+
+def _run_shard(input_path, video_path, csv_path, start_frame, end_frame):
+    _detector.detection_stats = dict.fromkeys(_detector.detection_stats, 0)
+    _detector.total_detections = 0
+    _detector.frame_count = 0
+    cap = cv2.VideoCapture(input_path)
+    try:
+        summary = _detector.process_frame_range(cap, video_path, csv_path, start_frame, end_frame)
+    finally:
+        cap.release()
+    return dict(summary, detection_stats=_detector.detection_stats,
+                total_detections=_detector.total_detections, frame_count=_detector.frame_count)
+
+
+def process_video_sharded(detector, input_path, output_video_path, output_csv_path, total_frames, workers):
+    """Process ``input_path`` in ``workers`` processes, merging outputs and statistics into ``detector``.
+
+    Returns the per-shard summaries of ``process_frame_range``.
+    """
+    ranges = shard_ranges(total_frames, workers)
+    threads = max(1, (os.cpu_count() or 1) // len(ranges))
+    logger.info(f"Splitting {total_frames} frames across {len(ranges)} processes ({threads} threads each)")
+    shard_dir = tempfile.mkdtemp(prefix='shards_', dir=os.path.dirname(output_csv_path) or '.')
+    video_parts = [os.path.join(shard_dir, f'segment_{i}.avi') for i in range(len(ranges))]
+    csv_parts = [os.path.join(shard_dir, f'part_{i}.csv') for i in range(len(ranges))]
+    try:
+        # spawn: forked workers would inherit the parent's torch/OpenCV thread pools
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(len(ranges), mp_context=context, initializer=_init_worker,
+                                 initargs=(detector.model_path, detector.backend_name, threads)) as pool:
+            futures = [pool.submit(_run_shard, input_path, video_path, csv_path, start, end)
+                       for video_path, csv_path, (start, end) in zip(video_parts, csv_parts, ranges)]
+            summaries = [future.result() for future in futures]
+
+        with open(output_csv_path, 'w', newline='') as out:
+            writer = csv.writer(out)
+            for i, csv_path in enumerate(csv_parts):
+                with open(csv_path, newline='') as part:
+                    rows = csv.reader(part)
+                    header = next(rows, None)
+                    if i == 0 and header:
+                        writer.writerow(header)
+                    writer.writerows(rows)
+        if ANNOTATE_OUTPUT:
+            concat_videos(video_parts, output_video_path, ffmpeg_binary=FFMPEG_BINARY)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    for summary in summaries:
+        for category, count in summary.pop('detection_stats').items():
+            detector.detection_stats[category] += count
+        detector.total_detections += summary.pop('total_detections')
+        detector.frame_count += summary.pop('frame_count')
+    return summaries
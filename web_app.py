@@ -1,25 +1,57 @@
-from flask import Flask, render_template, request, jsonify, send_file, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, url_for, stream_with_context
 from werkzeug.utils import secure_filename
 import os
 import cv2
 import numpy as np
 import torch
-from ultralytics import YOLO
 import logging
 from datetime import datetime
 import csv
 import base64
+import io
+import gzip
+import shutil
 import zipfile
+import threading
+import time
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from simple_config_v2 import *
+from jobs import JobManager, JobQueueFull, JobCancelled
+from result_cache import ResultCache, config_fingerprint, save_and_hash
+from retention import RetentionManager
+from inference_backend import create_backend
+from roi import create_roi
+from overlay import draw_label_lines
+from detection_postprocess import DepthCategoryTable, DetectionStats, estimate_depth_enhanced, filter_mask, postprocess_boxes
+from video_io import open_web_video_writer, MultiVideoWriter, OpenCVVideoWriter, read_frame_batches
+from pipeline import Pipeline
+from frame_sampler import create_sampler
+from zip_stream import stream_zip
+from metrics import REGISTRY, CONTENT_TYPE, SharedMetrics, timed_iter
+
+from live_frames import LatestFrame
+
+try:
+    import msgpack
+except ImportError:  # Only needed for MessagePack responses of /api/v1/detect
+    msgpack = None
+
+try:
+    from flask_sock import Sock, ConnectionClosed
+except ImportError:  # Only needed for the /ws/detect live endpoint
+    Sock = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+sock = Sock(app) if Sock else None
 
 # Configuration
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = MAX_BATCH_UPLOAD_MB * 1024 * 1024  # /upload itself is limited to MAX_UPLOAD_MB
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'web_output'
 
@@ -27,144 +59,113 @@ app.config['OUTPUT_FOLDER'] = 'web_output'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# Metrics of this worker process, exposed on /metrics
+STAGE_SECONDS = REGISTRY.histogram('pothole_stage_seconds', 'Time spent per call of each processing stage', ['stage'])
+STAGE = {stage: STAGE_SECONDS.labels(stage) for stage in (
+    'upload_save', 'decode', 'inference', 'postprocess', 'annotate', 'video_write', 'csv_write',
+    'image_encode', 'zip')}
+FRAMES_TOTAL = REGISTRY.counter('pothole_frames_total', 'Frames run through the model')
+DETECTIONS_TOTAL = REGISTRY.counter('pothole_detections_total', 'Potholes detected by depth category', ['category'])
+CATEGORY_DETECTIONS = {category: DETECTIONS_TOTAL.labels(category) for category in DEPTH_CATEGORIES}
+JOBS_FINISHED = REGISTRY.counter('pothole_jobs_finished_total', 'Video jobs finished by final status', ['status'])
+LIVE_FRAMES_DROPPED = REGISTRY.counter('pothole_live_frames_dropped_total', 'Stale live frames replaced before inference')
+JOBS_IN_FLIGHT = REGISTRY.gauge('pothole_jobs_in_flight', 'Video jobs queued or running', ['status'])
+# /metrics answers for all workers, whichever one takes the scrape
+shared_metrics = SharedMetrics(REGISTRY, METRICS_DIR, METRICS_PUBLISH_INTERVAL)
+
+def decode_image(data):
+    """Decode an encoded image from memory, None if it can't be read"""
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
 class WebPotholeDetector:
-    def __init__(self, model_path=MODEL_PATH):
+    def __init__(self, model_path=MODEL_PATH, backend=INFERENCE_BACKEND):
         self.model_path = model_path
-        self.device = 'cuda' if torch.cuda.is_available() and USE_GPU else 'cpu'
+        self.device = 'cuda' if torch.cuda.is_available() and USE_GPU and backend == 'ultralytics' and MODEL_PRECISION == 'fp32' else 'cpu'
         try:
-            self.model = YOLO(model_path)
-            logger.info(f"Model loaded successfully from {model_path}")
+            self.backend = create_backend(backend, model_path)
+            logger.info(f"Model loaded successfully from {model_path} ({self.backend.name} backend)")
             logger.info(f"Using device: {self.device}")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise
-        self.detection_stats = {category: 0 for category in DEPTH_CATEGORIES.keys()}
-        self.total_detections = 0
+        # The ultralytics predictor keeps per-call state and an ONNX session
+        # already uses all its threads, so concurrent requests take turns on the
+        # model itself; everything else is per-call.
+        self._model_lock = threading.Lock()
         self.depth_colors = {category: config['color'] for category, config in DEPTH_CATEGORIES.items()}
+        self.category_table = DepthCategoryTable(DEPTH_CATEGORIES)
         logger.info("Web Pothole Detector initialized successfully")
 
+    def prepare_for_fork(self):
+        """Finish all one-time model setup so forked workers share its memory.
+
+        Fusing Conv+BN layers happens lazily on the first prediction; doing it
+        here means workers never allocate their own fused copy of the weights.
+        """
+        self.backend.prepare_for_fork()
+
     def estimate_depth_enhanced(self, bbox_width, bbox_height, frame_width, frame_height, confidence):
-        frame_area = frame_width * frame_height
-        bbox_area = bbox_width * bbox_height
-        normalized_area = bbox_area / frame_area
-        
-        # Method 1: Area-based depth estimation
-        depth_area = max(MIN_DEPTH, MAX_DEPTH - (normalized_area * DEPTH_SCALE_FACTOR * 0.3))
-        
-        # Method 2: Aspect ratio based depth estimation
-        aspect_ratio = bbox_width / bbox_height if bbox_height > 0 else 1.0
-        depth_aspect = max(MIN_DEPTH, 0.25 - (aspect_ratio * 0.05))
-        
-        # Method 3: Size-based depth estimation
-        avg_size = (bbox_width + bbox_height) / 2
-        depth_size = max(MIN_DEPTH, 0.28 - (avg_size / frame_width * 0.2))
-        
-        # Method 4: Confidence-based depth adjustment
-        confidence_adjustment = 1.0 - (confidence * 0.3)
-        
-        # Weighted combination
-        depth_combined = (
-            depth_area * 0.4 +
-            depth_aspect * 0.2 +
-            depth_size * 0.4
-        ) * confidence_adjustment
-        
-        # Apply depth constraints
-        depth_final = max(MIN_DEPTH, min(MAX_DEPTH, depth_combined))
-        
-        return depth_final
+        return float(estimate_depth_enhanced(bbox_width, bbox_height, frame_width, frame_height, confidence))
 
     def get_depth_category_enhanced(self, depth):
-        for category, config in sorted(DEPTH_CATEGORIES.items(), key=lambda x: x[1]['priority']):
-            if depth <= config['max_depth']:
-                return category, self.depth_colors[category]
-        return 'critical', self.depth_colors['critical']
+        return self.category_table.category(depth)
 
     def filter_detections(self, detections, frame_shape):
-        if not ENABLE_FILTERING:
-            return detections
-        filtered_detections = []
-        for detection in detections:
-            if detection['confidence'] < MIN_DETECTION_CONFIDENCE:
-                continue
-            bbox_width = detection['width']
-            bbox_height = detection['height']
-            if bbox_width < MIN_BBOX_SIZE or bbox_height < MIN_BBOX_SIZE:
-                continue
-            if bbox_width > MAX_BBOX_SIZE or bbox_height > MAX_BBOX_SIZE:
-                continue
-            aspect_ratio = bbox_width / bbox_height if bbox_height > 0 else 1.0
-            if not (ASPECT_RATIO_RANGE[0] <= aspect_ratio <= ASPECT_RATIO_RANGE[1]):
-                continue
-            filtered_detections.append(detection)
-        return filtered_detections
+        keep = filter_mask([d['width'] for d in detections], [d['height'] for d in detections],
+                           [d['confidence'] for d in detections])
+        return [detection for detection, valid in zip(detections, keep) if valid]
+
+    def new_stats(self):
+        return DetectionStats(DEPTH_CATEGORIES)
+
+    def predict(self, frames, roi=None):
+        """``(xyxy, confidences)`` boxes for a list of frames (serialized between threads).
+
+        With a ``roi`` (see roi.py) only that region of each frame goes to the
+        model; boxes are still in frame coordinates.
+        """
+        FRAMES_TOTAL.inc(len(frames))
+        with self._model_lock, STAGE['inference'].time():
+            if roi is None:
+                return self.backend.predict(frames)
+            return roi.predict(self.backend.predict, frames)
 
     def detect_potholes_image(self, image_path):
-        """Detect potholes in a single image"""
+        """Detect potholes in a single image.
+
+        Returns ``(annotated_frame, detections, stats)``.
+        """
         frame = cv2.imread(image_path)
         if frame is None:
             raise ValueError("Could not read image")
         
-        annotated_frame = frame.copy()
-        detections = []
-        frame_height, frame_width = frame.shape[:2]
-        
-        results = self.model(frame, verbose=False, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD, show=False)
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    confidence = float(box.conf[0].cpu().numpy())
-                    width = x2 - x1
-                    height = y2 - y1
-                    depth = self.estimate_depth_enhanced(width, height, frame_width, frame_height, confidence)
-                    depth_category, color = self.get_depth_category_enhanced(depth)
-                    
-                    detection_info = {
-                        'bbox': (x1, y1, x2, y2),
-                        'width': width,
-                        'height': height,
-                        'depth': depth,
-                        'category': depth_category,
-                        'color': color,
-                        'confidence': confidence,
-                        'center': ((x1 + x2) // 2, (y1 + y2) // 2)
-                    }
-                    detections.append(detection_info)
-        
-        filtered_detections = self.filter_detections(detections, frame.shape)
-        
-        # Draw detections on frame
-        for detection in filtered_detections:
-            self.detection_stats[detection['category']] += 1
-            self.total_detections += 1
-            x1, y1, x2, y2 = detection['bbox']
-            color = detection['color']
-            thickness = max(1, int(detection['confidence'] * 5))
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, thickness)
-            
-            text_lines = [
-                f"Depth: {detection['depth']*100:.1f}cm",
-                f"Size: {detection['width']}x{detection['height']}px",
-                f"Category: {detection['category']}",
-                f"Conf: {detection['confidence']:.2f}"
-            ]
-            text_x = x1
-            text_y = y1 - 10
-            for i, line in enumerate(text_lines):
-                text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-                cv2.rectangle(annotated_frame, (text_x, text_y - text_size[1] - 5), 
-                             (text_x + text_size[0], text_y + 5), (0, 0, 0), -1)
-                cv2.putText(annotated_frame, line, (text_x, text_y - i * 15), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return self.detect_potholes_image_array(frame)
+
+    def detect_potholes_image_bytes(self, data, annotate=True):
+        """Detect potholes in an encoded image held in memory (no disk round trip)"""
+        with STAGE['decode'].time():
+            frame = decode_image(data)
+        if frame is None:
+            raise ValueError("Could not read image")
         
-        return annotated_frame, filtered_detections
+        return self.detect_potholes_image_array(frame, annotate)
+
+    def detect_potholes_image_array(self, frame, annotate=True):
+        stats = self.new_stats()
+        annotated_frame, detections = self.detect_potholes_batch([frame], stats, annotate)[0]
+        return annotated_frame, detections, stats
 
-    def detect_potholes_video(self, video_path, output_path):
-        """Detect potholes in video and save results"""
+    def detect_potholes_video(self, video_path, output_path, avi_path=None, progress_callback=None, should_cancel=None,
+                              annotate=True):
+        """Detect potholes in video, writing the web MP4, optional AVI and CSV.
+
+        ``progress_callback(progress)`` is called at most every PROGRESS_INTERVAL
+        seconds with frame counts, processing FPS, ETA and category counts.
+        Processing stops with JobCancelled as soon as ``should_cancel()`` is true.
+        Without ``annotate`` only the CSV (named after ``output_path``) is
+        written; frames are never copied, drawn on or encoded.
+        Returns ``(csv_path, stats)``.
+        """
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise ValueError(f"Could not open video: {video_path}")
@@ -174,87 +175,172 @@ class WebPotholeDetector:
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        output_fps = max(1, fps // 2)
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(output_path, fourcc, output_fps, (width, height))
+        # Encode the browser ready MP4 (and optionally the AVI) in the same pass
+        out = None
+        if annotate:
+            output_fps = max(1, fps // 2) if WRITE_ONLY_SAMPLED_FRAMES else max(1, fps)
+            out = open_web_video_writer(output_path, output_fps, (width, height), encoder=VIDEO_ENCODER,
+                                        codec=VIDEO_CODEC, crf=VIDEO_CRF, preset=VIDEO_PRESET,
+                                        scale=VIDEO_OUTPUT_SCALE, ffmpeg_binary=FFMPEG_BINARY)
+            if avi_path:
+                out = MultiVideoWriter([out, OpenCVVideoWriter(avi_path, output_fps, (width, height), fourcc='XVID')])
         
-        csv_path = output_path.replace('.avi', '.csv')
+        csv_path = os.path.splitext(output_path)[0] + '.csv'
         csv_file = open(csv_path, 'w', newline='')
         csv_writer = csv.writer(csv_file)
         csv_writer.writerow(['Frame', 'Timestamp', 'Width_px', 'Height_px', 'Depth_cm', 'Category', 'Confidence', 'X1', 'Y1', 'X2', 'Y2', 'Priority'])
         
-        frame_count = 0
-        processed_frames = 0
+        def write_frames(item):
+            # Annotation + encoding stage
+            frames, frame_detections = item
+            for frame, detections in zip(frames, frame_detections):
+                annotated = self.annotate_frame(frame, detections)
+                with STAGE['video_write'].time():
+                    out.write(annotated)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            if frame_count % FRAME_SKIP != 0:
-                continue
-            
-            processed_frames += 1
-            annotated_frame, detections = self.detect_potholes_image_from_frame(frame)
-            
-            # Write to CSV
-            timestamp = frame_count / fps
-            for detection in detections:
-                x1, y1, x2, y2 = detection['bbox']
-                priority = DEPTH_CATEGORIES[detection['category']]['priority']
-                csv_writer.writerow([
-                    frame_count, f"{timestamp:.2f}", detection['width'], detection['height'],
-                    f"{detection['depth']*100:.1f}", detection['category'], 
-                    f"{detection['confidence']:.3f}", x1, y1, x2, y2, priority
-                ])
-            
-            out.write(annotated_frame)
+        def write_rows(item):
+            # CSV stage
+            with STAGE['csv_write'].time():
+                write_csv_rows(item)
         
-        cap.release()
-        out.release()
-        csv_file.close()
+        def write_csv_rows(item):
+            for frame_count, detections in item:
+                timestamp = frame_count / fps
+                for detection in detections:
+                    x1, y1, x2, y2 = detection['bbox']
+                    priority = DEPTH_CATEGORIES[detection['category']]['priority']
+                    csv_writer.writerow([
+                        frame_count, f"{timestamp:.2f}", detection['width'], detection['height'],
+                        f"{detection['depth']*100:.1f}", detection['category'], 
+                        f"{detection['confidence']:.3f}", x1, y1, x2, y2, priority
+                    ])
         
-        return csv_path
-
-    def detect_potholes_image_from_frame(self, frame):
-        """Detect potholes in a frame (for video processing)"""
-        annotated_frame = frame.copy()
-        detections = []
-        frame_height, frame_width = frame.shape[:2]
+        # Decode, inference, annotate/encode and CSV writing overlap in separate
+        # threads (OpenCV and torch release the GIL); frame order is preserved.
+        # Queues holding frames are bounded in frames, so a job keeps about
+        # five times PIPELINE_QUEUE_FRAMES decoded frames in memory at most.
+        pipeline = Pipeline(PIPELINE_QUEUE_SIZE)
+        max_frames = PIPELINE_QUEUE_FRAMES or BATCH_SIZE
+        sampler = create_sampler(FRAME_SAMPLING, FRAME_SKIP)
+        roi = create_roi(ROI_MODE)
+        keep_skipped = annotate and not WRITE_ONLY_SAMPLED_FRAMES
+        frame_batches = read_frame_batches(cap, BATCH_SIZE, sampler=sampler, keep_skipped=keep_skipped,
+                                           max_frames=max_frames)
+        batches = pipeline.source(timed_iter(frame_batches, STAGE['decode']), 'decode', size=max_frames, weight=len)
+        frames_queue = pipeline.queue(max_frames, weight=lambda item: len(item[0]))
+        rows_queue = pipeline.queue()
+        if annotate:
+            pipeline.consumer(frames_queue, write_frames, 'encode')
+        pipeline.consumer(rows_queue, write_rows, 'csv')
         
-        results = self.model(frame, verbose=False, conf=CONFIDENCE_THRESHOLD, iou=NMS_THRESHOLD, show=False)
+        stats = self.new_stats()
+        processed_frames = 0
+        start_time = time.time()
+        last_progress = 0
+        last_detections = []
         
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    confidence = float(box.conf[0].cpu().numpy())
-                    width = x2 - x1
-                    height = y2 - y1
-                    depth = self.estimate_depth_enhanced(width, height, frame_width, frame_height, confidence)
-                    depth_category, color = self.get_depth_category_enhanced(depth)
-                    
-                    detection_info = {
-                        'bbox': (x1, y1, x2, y2),
-                        'width': width,
-                        'height': height,
-                        'depth': depth,
-                        'category': depth_category,
-                        'color': color,
-                        'confidence': confidence,
-                        'center': ((x1 + x2) // 2, (y1 + y2) // 2)
-                    }
-                    detections.append(detection_info)
+        try:
+            for batch in pipeline.iterate(batches):
+                if should_cancel and should_cancel():
+                    raise JobCancelled(f"Processing of {video_path} was cancelled")
+                
+                sampled = [(frame_count, frame) for frame_count, frame, is_sampled in batch if is_sampled]
+                processed_frames += len(sampled)
+                frames = [frame for _, frame in sampled]
+                batch_boxes = self.predict(frames, roi) if frames else []
+                batch_detections = iter([self.detections_from_boxes(frame, boxes, stats)
+                                         for frame, boxes in zip(frames, batch_boxes)])
+                
+                # Skipped frames (only present when every frame is written) repeat the last detections
+                frame_detections = []
+                rows = []
+                for frame_count, _, is_sampled in batch:
+                    if is_sampled:
+                        last_detections = next(batch_detections)
+                        rows.append((frame_count, last_detections))
+                    frame_detections.append(last_detections)
+                
+                if annotate:
+                    pipeline.put(frames_queue, ([frame for _, frame, _ in batch], frame_detections))
+                pipeline.put(rows_queue, rows)
+                
+                now = time.time()
+                if progress_callback and now - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = now
+                    progress_callback(self.progress_info(batch[-1][0], total_frames, processed_frames, now - start_time, stats, sampler))
+            
+            pipeline.finish([frames_queue, rows_queue])
+        except BaseException:
+            pipeline.abort()
+            raise
+        finally:
+            cap.release()
+            if out is not None:
+                out.release()
+            csv_file.close()
         
-        filtered_detections = self.filter_detections(detections, frame.shape)
+        if ROI_MODE != 'none':
+            logger.info(f"ROI for {video_path}: {roi.summary()}")
+        if progress_callback:
+            progress_callback(self.progress_info(total_frames, total_frames, processed_frames, time.time() - start_time, stats, sampler))
         
-        # Draw detections on frame
+        return csv_path, stats
+
+    def progress_info(self, frame_count, total_frames, processed_frames, elapsed, stats, sampler):
+        """Progress snapshot of a running video detection"""
+        frames_per_second = frame_count / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, total_frames - frame_count)
+        return {
+            'frame': frame_count,
+            'total_frames': total_frames,
+            'processed_frames': processed_frames,
+            'effective_skip': round(sampler.effective_skip, 2),
+            'percent': round(frame_count / total_frames * 100, 1) if total_frames > 0 else 0.0,
+            'fps': round(frames_per_second, 2),
+            'eta_seconds': round(remaining / frames_per_second, 1) if frames_per_second > 0 else None,
+            'total_detections': stats.total,
+            'categories': dict(stats.counts)
+        }
+
+    def detect_potholes_image_from_frame(self, frame, stats=None):
+        """Detect potholes in a frame (for video processing)"""
+        return self.detect_potholes_batch([frame], stats)[0]
+
+    def detect_potholes_batch(self, frames, stats=None, annotate=True):
+        """Detect potholes in several frames with a single model call.
+
+        Returns a list of ``(annotated_frame, detections)`` in input order
+        (``annotated_frame`` is None without ``annotate``); detections are
+        counted into ``stats`` when given.
+        """
+        batch_boxes = self.predict(frames, create_roi(ROI_MODE))
+        return [self.process_boxes(frame, boxes, stats, annotate) for frame, boxes in zip(frames, batch_boxes)]
+
+    def process_boxes(self, frame, boxes, stats=None, annotate=True):
+        """Turn one frame's model boxes into filtered, annotated detections"""
+        filtered_detections = self.detections_from_boxes(frame, boxes, stats)
+        annotated_frame = self.annotate_frame(frame, filtered_detections) if annotate else None
+        return annotated_frame, filtered_detections
+
+    def detections_from_boxes(self, frame, boxes, stats=None):
+        """Filtered detections of one frame's ``(xyxy, confidences)`` model boxes"""
+        with STAGE['postprocess'].time():
+            xyxy, confidences = boxes
+            filtered_detections = postprocess_boxes(xyxy, confidences, frame.shape, self.category_table)
         for detection in filtered_detections:
-            self.detection_stats[detection['category']] += 1
-            self.total_detections += 1
+            CATEGORY_DETECTIONS[detection['category']].inc()
+        if stats is not None:
+            stats.add(filtered_detections)
+        return filtered_detections
+
+    def annotate_frame(self, frame, detections):
+        """Copy of the frame with detections drawn on it"""
+        with STAGE['annotate'].time():
+            return self._annotate_frame(frame, detections)
+
+    def _annotate_frame(self, frame, detections):
+        annotated_frame = frame.copy()
+        for detection in detections:
             x1, y1, x2, y2 = detection['bbox']
             color = detection['color']
             thickness = max(1, int(detection['confidence'] * 5))
@@ -266,50 +352,307 @@ class WebPotholeDetector:
                 f"Category: {detection['category']}",
                 f"Conf: {detection['confidence']:.2f}"
             ]
-            text_x = x1
-            text_y = y1 - 10
-            for i, line in enumerate(text_lines):
-                text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-                cv2.rectangle(annotated_frame, (text_x, text_y - text_size[1] - 5), 
-                             (text_x + text_size[0], text_y + 5), (0, 0, 0), -1)
-                cv2.putText(annotated_frame, line, (text_x, text_y - i * 15), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        return annotated_frame, filtered_detections
-
-    def get_statistics(self):
-        """Get detection statistics"""
-        stats = {
-            'total_detections': self.total_detections,
-            'categories': {}
-        }
-        
-        for category, config in sorted(DEPTH_CATEGORIES.items(), key=lambda x: x[1]['priority']):
-            count = self.detection_stats[category]
-            percentage = (count / self.total_detections * 100) if self.total_detections > 0 else 0
-            stats['categories'][category] = {
-                'count': count,
-                'percentage': percentage,
-                'description': config['description'],
-                'priority': config['priority']
-            }
+            draw_label_lines(annotated_frame, text_lines, x1, y1 - 10)
         
-        return stats
+        return annotated_frame
 
-# Initialize the detector
+# Initialize the detector, shared by all request and job threads of this worker
 detector = WebPotholeDetector()
 
+# Background pool for video processing, job state is shared with the other workers on disk
+job_manager = JobManager(max_workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS, result_ttl=JOB_RESULT_TTL,
+                         state_dir=os.path.join(app.config['OUTPUT_FOLDER'], 'jobs'), stall_timeout=JOB_STALL_TIMEOUT,
+                         on_finish=lambda job: JOBS_FINISHED.labels(job.status).inc())
+for status in ('queued', 'running'):
+    JOBS_IN_FLIGHT.labels(status).set_function(lambda status=status: job_manager.count(status))
+
+# Results of identical uploads are served from the cache
+# (their files are kept or removed by the retention manager below, like all outputs)
+result_cache = ResultCache(os.path.join(app.config['OUTPUT_FOLDER'], 'cache'), app.config['OUTPUT_FOLDER'])
+
+# Keeps web_output/ within its disk budget, swept in the background of every worker
+retention = RetentionManager(app.config['OUTPUT_FOLDER'], RETENTION_MAX_MB * 1024 * 1024,
+                             max_age=RETENTION_MAX_AGE_HOURS * 3600, sweep_interval=RETENTION_SWEEP_INTERVAL,
+                             orphan_grace=RETENTION_ORPHAN_GRACE)
+
+@app.before_request
+def start_retention():
+    # Started lazily so it runs in each forked worker, not in the preloading master
+    retention.start()
+    shared_metrics.start()
+
+# Configuration that changes the produced outputs, part of the cache key
+RESULT_SETTINGS = [
+    'CONFIDENCE_THRESHOLD', 'NMS_THRESHOLD', 'FRAME_SKIP', 'FRAME_SAMPLING', 'MOTION_TARGET', 'MOTION_MIN_SKIP',
+    'MOTION_MAX_SKIP', 'MOTION_DOWNSCALE_WIDTH', 'MIN_BBOX_SIZE', 'MAX_BBOX_SIZE',
+    'DEPTH_SCALE_FACTOR', 'MIN_DEPTH', 'MAX_DEPTH', 'DEPTH_CATEGORIES', 'ASPECT_RATIO_RANGE',
+    'ENABLE_FILTERING', 'MIN_DETECTION_CONFIDENCE', 'VIDEO_CODEC', 'VIDEO_CRF', 'VIDEO_PRESET',
+    'VIDEO_OUTPUT_SCALE', 'SAVE_AVI', 'WRITE_ONLY_SAMPLED_FRAMES', 'INFERENCE_BACKEND', 'INFERENCE_SIZE', 'ONNX_IMAGE_SIZE',
+    'MODEL_PRECISION', 'ROI_MODE', 'ROI_BAND', 'ROI_POLYGON', 'ROI_AUTO_FRAMES', 'ROI_AUTO_MIN_DETECTIONS',
+    'ROI_AUTO_COVERAGE', 'ROI_AUTO_MARGIN'
+]
+result_fingerprint = config_fingerprint(MODEL_PATH, {name: globals()[name] for name in RESULT_SETTINGS})
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+
+# Decodes and encodes the images of batch uploads
+image_pool = ThreadPoolExecutor(max_workers=IMAGE_DECODE_WORKERS, thread_name_prefix='image-codec')
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'mp4', 'avi', 'mov', 'mkv'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def format_detections(detections):
+    """Client facing view of a frame's detections"""
+    return [
+        {
+            'depth': f"{d['depth']*100:.1f}cm",
+            'category': d['category'],
+            'confidence': f"{d['confidence']:.2f}",
+            'size': f"{d['width']}x{d['height']}px"
+        } for d in detections
+    ]
+
+def compact_detections(detections):
+    """Numeric view of a frame's detections for machine clients (/api/v1/detect)"""
+    return [
+        {
+            'bbox': list(d['bbox']),
+            'depth_cm': round(d['depth'] * 100, 1),
+            'category': d['category'],
+            'priority': DEPTH_CATEGORIES[d['category']]['priority'],
+            'confidence': round(d['confidence'], 3)
+        } for d in detections
+    ]
+
+def batch_images(files):
+    """Yield ``(filename, data)`` for every image upload, expanding ZIP archives"""
+    for file in files:
+        extension = file_extension(file.filename)
+        if extension == 'zip':
+            with zipfile.ZipFile(file.stream) as archive:
+                for info in archive.infolist():
+                    name = secure_filename(os.path.basename(info.filename))
+                    if info.is_dir() or file_extension(name) not in IMAGE_EXTENSIONS:
+                        continue
+                    if info.file_size > MAX_UPLOAD_MB * 1024 * 1024:
+                        raise ValueError(f"{name} in {file.filename} exceeds {MAX_UPLOAD_MB}MB")
+                    yield name, archive.read(info)
+        elif extension in IMAGE_EXTENSIONS:
+            yield secure_filename(file.filename), file.read()
+        else:
+            raise ValueError(f"Invalid file type: {file.filename}. Allowed: images or a ZIP of images")
+
+def encode_jpeg(frame, quality=JPEG_QUALITY, max_dimension=MAX_IMAGE_DIMENSION):
+    """JPEG bytes of a frame, downscaled so its longer side fits ``max_dimension``"""
+    height, width = frame.shape[:2]
+    if max_dimension and max(height, width) > max_dimension:
+        scale = max_dimension / max(height, width)
+        frame = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    with STAGE['image_encode'].time():
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return buffer.tobytes()
+
+def process_video_job(job, filepath, filename, cache_key=None, annotate=True):
+    """Run detection on an uploaded video (executed by the job pool)"""
+    try:
+        output_mp4 = os.path.join(app.config['OUTPUT_FOLDER'], f"processed_{filename}.mp4")
+        output_avi = os.path.join(app.config['OUTPUT_FOLDER'], f"processed_{filename}.avi") if SAVE_AVI and annotate else None
+        csv_path, detection_stats = detector.detect_potholes_video(
+            filepath, output_mp4, avi_path=output_avi,
+            progress_callback=lambda progress: job_manager.report_progress(job, progress),
+            should_cancel=lambda: job_manager.is_cancelled(job), annotate=annotate)
+        if not annotate:
+            output_mp4 = None
+        stats = detection_stats.to_dict()
+        
+        # Create detection summary for video
+        detections_summary = []
+        if stats['total_detections'] > 0:
+            for category, cat_stats in stats['categories'].items():
+                if cat_stats['count'] > 0:
+                    detections_summary.append({
+                        'depth': f"Variable (see CSV)",
+                        'category': category,
+                        'confidence': f"See CSV for details",
+                        'size': f"{cat_stats['count']} detections"
+                    })
+        
+        result = {
+            'video_file': os.path.basename(output_mp4) if output_mp4 else None,
+            'csv_file': os.path.basename(csv_path),
+            # Bundled from the files above when downloaded, see download_file()
+            'zip_file': f"results_{filename}.zip",
+            'detections': detections_summary,
+            'statistics': stats
+        }
+        files = [os.path.basename(path) for path in (output_mp4, output_avi, csv_path) if path]
+        retention.register(job.id, files)
+        if cache_key:
+            result_cache.put(cache_key, result, files)
+        return result
+    finally:
+        cleanup_video_job(job, filepath, filename, cache_key)
+
+def cleanup_video_job(job, filepath, _filename, cache_key=None, *_):
+    """Release the cache claim and uploaded file of a video job (also when cancelled before it ran)"""
+    if cache_key:
+        result_cache.release(cache_key, job.id)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+def job_active(job_id):
+    """Whether a job (in any worker) is still queued or running, and not abandoned by a dead worker"""
+    job = job_manager.get(job_id)
+    return job is not None and job_manager.is_active(job)
+
+def video_results(result):
+    """Build the client facing results payload of a finished video job"""
+    return {
+        'video_url': url_for('download_file', filename=result['video_file']) if result['video_file'] else None,
+        'csv_url': url_for('download_file', filename=result['csv_file']),
+        'zip_url': url_for('download_file', filename=result['zip_file']),
+        'detections': result['detections'],
+        'statistics': result['statistics']
+    }
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def wants_annotations():
+    """False when the client only wants detections (``annotate=0``), no annotated image or video"""
+    return request.values.get('annotate', '1').lower() not in ('0', 'false', 'no')
+
+def wants_binary_image():
+    """Whether the client asked for the raw annotated JPEG instead of JSON"""
+    if request.args.get('format') == 'binary':
+        return True
+    return request.accept_mimetypes['image/jpeg'] > request.accept_mimetypes['application/json']
+
+API_MIMETYPES = ['application/json'] + (['application/msgpack', 'application/x-msgpack'] if msgpack else [])
+
+def api_response(payload, status=200):
+    """Serialize an /api/v1 payload as JSON or MessagePack, whichever the Accept header prefers"""
+    mimetype = request.accept_mimetypes.best_match(API_MIMETYPES, default='application/json')
+    if mimetype == 'application/json':
+        body = json.dumps(payload, separators=(',', ':'))
+    else:
+        body = msgpack.packb(payload)
+    return Response(body, status=status, mimetype=mimetype)
+
+@app.route('/api/v1/detect', methods=['POST'])
+def api_detect():
+    """Detections of one image for machine clients: no annotation, no files written.
+
+    The image comes as the ``file`` form field or as the raw request body.
+    Responds with numeric detections in JSON or, when the ``msgpack``
+    package is installed and ``Accept`` asks for it, MessagePack.
+    """
+    # Only a declared length can be checked before reading; MAX_CONTENT_LENGTH is the batch limit
+    if request.content_length is None:
+        return api_response({'error': 'Content-Length required'}, 411)
+    if request.content_length > MAX_UPLOAD_MB * 1024 * 1024:
+        return api_response({'error': f'File too large (max {MAX_UPLOAD_MB}MB)'}, 413)
+    if request.accept_mimetypes and not request.accept_mimetypes.best_match(API_MIMETYPES):
+        return jsonify({'error': f'Not acceptable, supported: {", ".join(API_MIMETYPES)}'}), 406
+    file = request.files.get('file')
+    data = file.read() if file else request.get_data()
+    if not data:
+        return api_response({'error': 'No image in request'}, 400)
+    with STAGE['decode'].time():
+        frame = decode_image(data)
+    if frame is None:
+        return api_response({'error': 'Could not read image'}, 400)
+    try:
+        _, detections = detector.detect_potholes_batch([frame], annotate=False)[0]
+    except Exception as e:
+        logger.error(f"Error processing API request: {e}")
+        return api_response({'error': f'Error processing image: {str(e)}'}, 500)
+    height, width = frame.shape[:2]
+    return api_response({'width': width, 'height': height, 'detections': compact_detections(detections)})
+
+def receive_live_frames(ws, frames):
+    """Feed a live client's messages into ``frames`` until it disconnects"""
+    try:
+        while True:
+            frames.put(ws.receive())
+    except ConnectionClosed:
+        pass
+    finally:
+        frames.close()
+
+def live_detect(ws):
+    """Detect potholes in JPEG frames pushed over a WebSocket (registered as /ws/detect).
+
+    Every binary message is one encoded frame; each processed frame is
+    answered with a JSON text message holding its detections and the
+    server-side latency. Only the newest frame is processed: frames that
+    arrive while the model is busy replace the waiting one (``dropped``).
+    """
+    frames = LatestFrame()
+    threading.Thread(target=receive_live_frames, args=(ws, frames), daemon=True, name='live-receive').start()
+    roi = create_roi(ROI_MODE)
+    dropped = 0
+    try:
+        while True:
+            item = frames.take()
+            if item is None:
+                break
+            sequence, data, received_at = item
+            LIVE_FRAMES_DROPPED.inc(frames.dropped - dropped)
+            dropped = frames.dropped
+            if not isinstance(data, bytes):
+                ws.send(json.dumps({'frame': sequence, 'error': 'Expected a binary JPEG frame'}))
+                continue
+            started = time.perf_counter()
+            with STAGE['decode'].time():
+                frame = decode_image(data)
+            if frame is None:
+                ws.send(json.dumps({'frame': sequence, 'error': 'Could not read image'}))
+                continue
+            decoded = time.perf_counter()
+            boxes = detector.predict([frame], roi)[0]
+            detections = detector.detections_from_boxes(frame, boxes)
+            done = time.perf_counter()
+            height, width = frame.shape[:2]
+            ws.send(json.dumps({
+                'frame': sequence,
+                'dropped': dropped,
+                'width': width,
+                'height': height,
+                'detections': compact_detections(detections),
+                'latency_ms': {
+                    'queued': round((started - received_at) * 1000, 1),
+                    'decode': round((decoded - started) * 1000, 1),
+                    'inference': round((done - decoded) * 1000, 1),
+                    'total': round((done - received_at) * 1000, 1)
+                }
+            }, separators=(',', ':')))
+    except ConnectionClosed:
+        pass
+    finally:
+        frames.close()
+
+if sock is not None:
+    sock.route('/ws/detect')(live_detect)
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    filepath = None
+    # Only a declared length can be checked before reading; MAX_CONTENT_LENGTH is the batch limit
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    if request.content_length > MAX_UPLOAD_MB * 1024 * 1024:
+        return jsonify({'error': f'File too large (max {MAX_UPLOAD_MB}MB), use /upload/batch for many images'}), 413
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file part'}), 400
@@ -323,107 +666,112 @@ def upload_file():
         
         filename = secure_filename(file.filename)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
+        # The job id keeps upload and output names unique across concurrent requests
+        job_id = job_manager.new_job_id()
+        filename = f"{timestamp}_{job_id}_{filename}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Reset detector stats
-        detector.detection_stats = {category: 0 for category in DEPTH_CATEGORIES.keys()}
-        detector.total_detections = 0
         
-        file_ext = filename.rsplit('.', 1)[1].lower()
+        file_ext = file_extension(filename)
+        annotate = wants_annotations()
         
-        if file_ext in ['mp4', 'avi', 'mov', 'mkv']:
-            # Process video
-            output_video = os.path.join(app.config['OUTPUT_FOLDER'], f"processed_{filename}.avi")
-            csv_path = detector.detect_potholes_video(filepath, output_video)
+        if file_ext in VIDEO_EXTENSIONS:
+            with STAGE['upload_save'].time():
+                content_hash = save_and_hash(file, filepath)
+            fingerprint = result_fingerprint if annotate else f"{result_fingerprint}:csv"
+            cache_key = ResultCache.key(content_hash, fingerprint) if ENABLE_RESULT_CACHE else None
             
-            # Create MP4 version for web playback
-            output_mp4 = os.path.join(app.config['OUTPUT_FOLDER'], f"processed_{filename}.mp4")
-            try:
-                # Convert AVI to MP4 for better browser compatibility
-                cap = cv2.VideoCapture(output_video)
-                fps = int(cap.get(cv2.CAP_PROP_FPS))
-                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out_mp4 = cv2.VideoWriter(output_mp4, fourcc, fps, (width, height))
-                
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    out_mp4.write(frame)
-                
-                cap.release()
-                out_mp4.release()
-            except Exception as e:
-                logger.warning(f"Could not create MP4 version: {e}")
-                output_mp4 = output_video  # Fallback to AVI
-            
-            # Create zip file with results
-            zip_path = os.path.join(app.config['OUTPUT_FOLDER'], f"results_{filename}.zip")
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                zipf.write(output_video, os.path.basename(output_video))
-                if output_mp4 != output_video:
-                    zipf.write(output_mp4, os.path.basename(output_mp4))
-                zipf.write(csv_path, os.path.basename(csv_path))
+            if cache_key:
+                # Identical upload already processed
+                cached = result_cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Serving cached results for {filename}")
+                    retention.touch(cached['video_file'] or cached['csv_file'])
+                    return jsonify({
+                        'success': True,
+                        'cached': True,
+                        'message': 'Video processed successfully',
+                        'results': video_results(cached)
+                    })
             
-            stats = detector.get_statistics()
+            if cache_key:
+                # Identical upload being processed right now, share its job
+                owner = result_cache.claim(cache_key, job_id, job_active)
+                if owner != job_id:
+                    return jsonify({
+                        'success': True,
+                        'coalesced': True,
+                        'message': 'Identical video already in progress',
+                        'job_id': owner,
+                        'status_url': url_for('job_status', job_id=owner),
+                        'events_url': url_for('job_events', job_id=owner),
+                        'cancel_url': url_for('cancel_job', job_id=owner)
+                    }), 202
             
-            # Create detection summary for video
-            detections_summary = []
-            if stats['total_detections'] > 0:
-                for category, cat_stats in stats['categories'].items():
-                    if cat_stats['count'] > 0:
-                        detections_summary.append({
-                            'depth': f"Variable (see CSV)",
-                            'category': category,
-                            'confidence': f"See CSV for details",
-                            'size': f"{cat_stats['count']} detections"
-                        })
+            # Queue video processing, the job owns the uploaded file from here on
+            try:
+                job = job_manager.submit(process_video_job, filepath, filename, cache_key, annotate,
+                                         filename=filename, job_id=job_id, cleanup=cleanup_video_job)
+            except JobQueueFull as e:
+                if cache_key:
+                    result_cache.release(cache_key, job_id)
+                return jsonify({'error': str(e)}), 503
+            filepath = None
             
             return jsonify({
                 'success': True,
-                'message': 'Video processed successfully',
-                'results': {
-                    'video_url': url_for('download_file', filename=f"processed_{filename}.mp4" if output_mp4 != output_video else f"processed_{filename}.avi"),
-                    'csv_url': url_for('download_file', filename=os.path.basename(csv_path)),
-                    'zip_url': url_for('download_file', filename=f"results_{filename}.zip"),
-                    'detections': detections_summary,
-                    'statistics': stats
-                }
-            })
+                'message': 'Video queued for processing',
+                'job_id': job.id,
+                'status_url': url_for('job_status', job_id=job.id),
+                'events_url': url_for('job_events', job_id=job.id),
+                'cancel_url': url_for('cancel_job', job_id=job.id)
+            }), 202
         
         else:
-            # Process image
-            annotated_image, detections = detector.detect_potholes_image(filepath)
+            # Process image straight from the request, never touching uploads/
+            try:
+                annotated_image, detections, detection_stats = detector.detect_potholes_image_bytes(file.read(), annotate)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            stats = detection_stats.to_dict()
             
-            # Save annotated image
-            output_image = os.path.join(app.config['OUTPUT_FOLDER'], f"processed_{filename}")
-            cv2.imwrite(output_image, annotated_image)
+            if not annotate:
+                return jsonify({
+                    'success': True,
+                    'message': 'Image processed successfully',
+                    'results': {
+                        'detections': format_detections(detections),
+                        'statistics': stats
+                    }
+                })
             
-            # Convert to base64 for display
-            _, buffer = cv2.imencode('.jpg', annotated_image)
-            img_base64 = base64.b64encode(buffer).decode('utf-8')
+            # Encode once, the same JPEG is stored for download and returned
+            output_name = f"processed_{os.path.splitext(filename)[0]}.jpg"
+            jpeg = encode_jpeg(annotated_image)
+            with open(os.path.join(app.config['OUTPUT_FOLDER'], output_name), 'wb') as f:
+                f.write(jpeg)
+            retention.register(output_name, [output_name])
+            download_url = url_for('download_file', filename=output_name)
             
-            stats = detector.get_statistics()
+            if wants_binary_image():
+                headers = {
+                    'X-Download-Url': download_url,
+                    'X-Total-Detections': str(stats['total_detections'])
+                }
+                detections_json = json.dumps(format_detections(detections), separators=(',', ':'))
+                if len(detections_json) <= DETECTIONS_HEADER_MAX_BYTES:
+                    headers['X-Detections'] = detections_json
+                else:
+                    headers['X-Detections-Truncated'] = 'true'
+                return Response(jpeg, mimetype='image/jpeg', headers=headers)
             
+            img_base64 = base64.b64encode(jpeg).decode('ascii')
             return jsonify({
                 'success': True,
                 'message': 'Image processed successfully',
                 'results': {
                     'image_data': f"data:image/jpeg;base64,{img_base64}",
-                    'download_url': url_for('download_file', filename=f"processed_{filename}"),
-                    'detections': [
-                        {
-                            'depth': f"{d['depth']*100:.1f}cm",
-                            'category': d['category'],
-                            'confidence': f"{d['confidence']:.2f}",
-                            'size': f"{d['width']}x{d['height']}px"
-                        } for d in detections
-                    ],
+                    'download_url': download_url,
+                    'detections': format_detections(detections),
                     'statistics': stats
                 }
             })
@@ -434,17 +782,256 @@ def upload_file():
     
     finally:
         # Clean up uploaded file
-        if 'filepath' in locals() and os.path.exists(filepath):
+        if filepath and os.path.exists(filepath):
             os.remove(filepath)
 
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Detect potholes in many images (or ZIP archives of images) in one request.
+
+    Images are decoded in a thread pool and inferred BATCH_SIZE at a time; the
+    annotated images and a CSV of all detections are returned as one ZIP
+    (just the CSV with ``annotate=0``).
+    """
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_name = f"batch_results_{timestamp}_{job_manager.new_job_id()[:8]}.zip"
+    zip_path = os.path.join(app.config['OUTPUT_FOLDER'], zip_name)
+    stats = detector.new_stats()
+    images = []
+    errors = []
+    used_names = set()
+    keep_zip = False
+    annotate = wants_annotations()
+    
+    try:
+        with zipfile.ZipFile(zip_path, 'w') as zipf:
+            csv_rows = [['Image', 'Width_px', 'Height_px', 'Depth_cm', 'Category', 'Confidence', 'X1', 'Y1', 'X2', 'Y2', 'Priority']]
+            sources = batch_images(files)
+            count = 0
+            while True:
+                chunk = []
+                for name, data in sources:
+                    count += 1
+                    if count > MAX_BATCH_IMAGES:
+                        return jsonify({'error': f'Too many images (max {MAX_BATCH_IMAGES})'}), 400
+                    chunk.append((name, data))
+                    if len(chunk) == BATCH_SIZE:
+                        break
+                if not chunk:
+                    break
+                
+                with STAGE['decode'].time():
+                    frames = list(image_pool.map(decode_image, [data for _, data in chunk]))
+                decoded = []
+                for (name, _), frame in zip(chunk, frames):
+                    if frame is None:
+                        errors.append({'filename': name, 'error': 'Could not read image'})
+                    else:
+                        decoded.append((name, frame))
+                if not decoded:
+                    continue
+                
+                outputs = detector.detect_potholes_batch([frame for _, frame in decoded], stats, annotate)
+                if annotate:
+                    encoded = image_pool.map(encode_jpeg, [annotated for annotated, _ in outputs])
+                else:
+                    encoded = [None] * len(outputs)
+                for (name, _), (_, detections), jpeg in zip(decoded, outputs, encoded):
+                    output_name = None
+                    if jpeg is not None:
+                        stem = os.path.splitext(name)[0]
+                        output_name = f"processed_{stem}.jpg"
+                        suffix = 1
+                        while output_name in used_names:
+                            output_name = f"processed_{stem}_{suffix}.jpg"
+                            suffix += 1
+                        used_names.add(output_name)
+                        # JPEGs don't compress any further
+                        zipf.writestr(output_name, jpeg, compress_type=zipfile.ZIP_STORED)
+                    
+                    for d in detections:
+                        x1, y1, x2, y2 = d['bbox']
+                        csv_rows.append([output_name or name, d['width'], d['height'], f"{d['depth']*100:.1f}", d['category'],
+                                         f"{d['confidence']:.3f}", x1, y1, x2, y2,
+                                         DEPTH_CATEGORIES[d['category']]['priority']])
+                    images.append({
+                        'filename': name,
+                        'output_file': output_name,
+                        'total_detections': len(detections),
+                        'detections': format_detections(detections)
+                    })
+            
+            if not images and not errors:
+                return jsonify({'error': 'No images found in upload'}), 400
+            
+            csv_buffer = io.StringIO()
+            csv.writer(csv_buffer).writerows(csv_rows)
+            with STAGE['zip'].time():
+                zipf.writestr('detections.csv', csv_buffer.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+        
+        retention.register(zip_name, [zip_name])
+        keep_zip = True
+        return jsonify({
+            'success': True,
+            'message': f'{len(images)} images processed',
+            'results': {
+                'zip_url': url_for('download_file', filename=zip_name),
+                'images': images,
+                'errors': errors,
+                'statistics': stats.to_dict()
+            }
+        })
+    
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error processing batch: {e}")
+        return jsonify({'error': f'Error processing batch: {str(e)}'}), 500
+    
+    finally:
+        # Only keep the results ZIP of a successful batch
+        if not keep_zip and os.path.exists(zip_path):
+            os.remove(zip_path)
+
+def job_response(job):
+    """Status payload of a job, with results once done"""
+    response = job_manager.status(job)
+    if job.status == 'done':
+        response['success'] = True
+        response['message'] = 'Video processed successfully'
+        response['results'] = video_results(job.result)
+    elif job.status == 'failed':
+        response['success'] = False
+        response['error'] = f'Error processing file: {job.error}'
+    elif job.status == 'cancelled':
+        response['success'] = False
+        response['error'] = 'Processing was cancelled'
+    return response
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status of a queued video job, with results once done"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's progress until it finishes"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    def stream():
+        subscription = job_manager.events.subscribe(job_id)
+        try:
+            current = job_manager.get(job_id)
+            yield sse_event('status', job_manager.status(current))
+            last_progress = None
+            while current is not None and not current.finished:
+                local = job_manager.is_local(current)
+                try:
+                    event, data = subscription.get(timeout=SSE_KEEPALIVE_INTERVAL if local else PROGRESS_INTERVAL)
+                    if event == 'progress':
+                        yield sse_event('progress', data)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                # Jobs running in another worker only report through their state file
+                current = job_manager.get(job_id)
+                if current is not None and not local and current.progress != last_progress:
+                    last_progress = current.progress
+                    yield sse_event('progress', current.progress)
+            if current is None:
+                yield sse_event('error', {'error': 'Unknown job'})
+            else:
+                yield sse_event('done', job_response(current))
+        finally:
+            job_manager.events.unsubscribe(job_id, subscription)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Stop a queued or running video job"""
+    if not job_manager.cancel(job_id):
+        return jsonify({'error': 'Unknown or already finished job'}), 404
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
+def gzipped_copy(path):
+    """Path of a gzip-compressed copy of ``path``, created on first use"""
+    gz_path = f"{path}.gz"
+    if not os.path.exists(gz_path) or os.path.getmtime(gz_path) < os.path.getmtime(path):
+        tmp_path = f"{gz_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, gz_path)
+    return gz_path
+
+def send_output(filename, **kwargs):
+    """Send a processed output with range support, validators and long-lived caching.
+
+    Outputs are written once under a unique name and never modified, so
+    clients may cache them indefinitely; ETag/Last-Modified still let them
+    revalidate and ``Range`` requests are answered with 206 partial content.
+    """
+    response = send_from_directory(app.config['OUTPUT_FOLDER'], filename, conditional=True, etag=True,
+                                   max_age=DOWNLOAD_MAX_AGE, **kwargs)
+    retention.touch(filename)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def results_bundle(filename):
+    """Output files of the video job a ``results_<name>.zip`` bundle stands for"""
+    name = secure_filename(filename)
+    if not (name.startswith('results_') and name.endswith('.zip')):
+        return []
+    stem = name[len('results_'):-len('.zip')]
+    paths = [os.path.join(app.config['OUTPUT_FOLDER'], f"processed_{stem}{extension}")
+             for extension in ('.mp4', '.avi', '.csv')]
+    return [path for path in paths if os.path.isfile(path)]
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_file(os.path.join(app.config['OUTPUT_FOLDER'], filename), as_attachment=True)
+    bundle = results_bundle(filename)
+    if bundle and not os.path.exists(os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(filename))):
+        # Zipped on the fly, so the outputs are never stored twice
+        for path in bundle:
+            retention.touch(os.path.basename(path))
+        return Response(timed_iter(stream_zip(bundle), STAGE['zip']), mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename={secure_filename(filename)}',
+                                 'Cache-Control': 'no-cache'})
+    if GZIP_CSV and filename.endswith('.csv'):
+        path = os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(filename))
+        if os.path.isfile(path):
+            if 'gzip' in request.accept_encodings:
+                response = send_output(os.path.basename(gzipped_copy(path)), as_attachment=True,
+                                       download_name=filename, mimetype='text/csv')
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = send_output(filename, as_attachment=True)
+            response.vary.add('Accept-Encoding')
+            return response
+    return send_output(filename, as_attachment=True)
 
 @app.route('/video/<filename>')
 def serve_video(filename):
-    """Serve video files for inline playback"""
-    return send_file(os.path.join(app.config['OUTPUT_FOLDER'], filename), mimetype='video/mp4')
+    """Serve video files for inline playback (seekable through range requests)"""
+    return send_output(filename, mimetype='video/mp4')
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of the metrics of all workers"""
+    return Response(shared_metrics.render(), content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+import time
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+# Already compressed formats are stored as-is, deflating them only costs CPU
+STORED_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.jpg', '.jpeg', '.png', '.gif', '.zip', '.gz'}
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are collected and handed out in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def compress_type_for(path):
+    extension = os.path.splitext(path)[1].lower()
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(paths, chunk_size=CHUNK_SIZE):
+    """Yield a ZIP archive of ``paths`` chunk by chunk, without writing it to disk.
+
+    Each file is stored under its base name; videos and images are stored
+    uncompressed, everything else (e.g. CSV) is deflated.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for path in paths:
+            info = zipfile.ZipInfo(os.path.basename(path), time.localtime(os.path.getmtime(path))[:6])
+            info.compress_type = compress_type_for(path)
+            with open(path, 'rb') as src, archive.open(info, 'w', force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()